@@ -1,22 +1,26 @@
 import subprocess
-import yaml
 import argparse
 from pathlib import Path
 import os
 import time
 import re
+import sys
+import csv
+import json
+import html
+import gzip
+import copy
+import shutil
+import threading
+from datetime import datetime
+import socket
+import socketserver
+import signal
+from collections import deque
+from collections.abc import Mapping
+from contextlib import contextmanager
 
-from prompt_toolkit import Application
-from prompt_toolkit.completion import CompleteEvent,WordCompleter, NestedCompleter,Completion
 from typing import Iterable
-from prompt_toolkit.document import Document
-from prompt_toolkit.layout import Layout
-from prompt_toolkit.layout.containers import HSplit, Window
-from prompt_toolkit.layout.controls import FormattedTextControl
-from prompt_toolkit.key_binding import KeyBindings
-from prompt_toolkit.widgets import TextArea
-
-from prompt_toolkit.formatted_text import HTML
 
 HELP_MESSAGE = """
     ### All modes (OPEN and GROUP) ###
@@ -36,10 +40,22 @@ HELP_MESSAGE = """
         resource <PROJECT> <RESOURCE> <ACTION>  -> do action for resource
         show-resources  -> toggle whether to show resources in group view
         show-cat <CATEGORY>  -> toggle whether to show corresponding context after project name
+        overview-sort <name|count>  -> sort contexts in the category overview (f2) by name or number of projects
+        check      -> check links, notes and resource folders for problems
+        check-fix  -> fix the problems in the data (empty entries, links to archived contexts)
+        history                -> list the snapshots written by dump
+        view-at <NUMBER|TIME>  -> show a snapshot read-only (number from history or time like 2024-05-01T12:00)
+        view-at now            -> back to the current data
+        disk [size|name]       -> disk usage of the cloned resources (scanned in the background), sorted by size or name
+        disk-prune             -> list clones of archived or deleted projects and resources, then
+        disk-prune-apply       -> delete them (cannot be undone)
+        workspace <TAG>        -> workspace for new projects, contexts and categories, code, history and view-at (with --with)
 
 
     # Modifications
         dump    -> Dump changes to file 
+        undo [<N>]  -> undo the last (N) modifications
+        redo [<N>]  -> redo the last (N) undone modifications
         create <PROJECT>      -> create a new project
         delete <PROJECT>      -> delete a projects
         link <PROJECT> <CATEGORY> <CONTEXT>    -> Create a new link
@@ -62,6 +78,17 @@ HELP_MESSAGE = """
         archive <PROJECT>                          -> archive a project
         archive-context <CATEGORY> <CONTEXT>       -> archive a context
 
+    # Bulk modifications (all projects passing the current filters, or the filters after @)
+        bulk link <CATEGORY> <CONTEXT> [@ <CATEGORY> <CONTEXT> ...]         -> preview, then
+        bulk unlink <CATEGORY> <CONTEXT> [@ ...]                              bulk-apply  -> apply all at once (one undo step)
+        bulk move <CATEGORY> <FROM-CONTEXT> <TO-CONTEXT> [@ ...]              bulk-cancel -> discard
+        bulk archive [@ ...]
+        bulk qnote [@ ... --] <TEXT>
+
+    # Export
+        export <FORMAT> <PATH> [<SCOPE>]  -> write md, jsonl or csv to PATH
+                                             SCOPE: view (default), categories (f2 overview) or data (everything)
+
     ### In OPEN-mode only ###
     (<PROJECT> is left out for commands:)
 
@@ -86,26 +113,70 @@ HELP_MESSAGE = """
 NOTES_SUBPATH = 'notes'
 RESOURCES_SUBPATH = 'resources'
 FAST_SCROLL = 10
+EXPORT_FORMATS = ['md', 'jsonl', 'csv']
+EXPORT_SCOPES = ['view', 'categories', 'data']
+UNDO_DEPTH = 100  # number of commands that can be undone
+UNDO_BUDGET = 32 * 1024 * 1024  # estimated bytes of the undo data, older commands are dropped (the last one is always kept)
+BULK_ACTIONS = {'link': 2, 'unlink': 2, 'move': 3, 'archive': 0, 'qnote': None}  # number of arguments (None: any)
+FRECENCY_CACHE = '.pm_frecency.json'  # usage of projects, categories, ... inside LOCATION
+FRECENCY_HALF_LIFE = 7 * 24 * 3600  # seconds until a use counts only half
+FRECENCY_SIZE = 1000  # number of entries kept in the cache
+USAGE_ARGS = {  # kind of the arguments of a command, for the ranking of completions
+    'open': ['project'], 'note': ['project'], 'delete': ['project'], 'archive': ['project'],
+    'qnote': ['project'], 'qnote-delete': ['project'],
+    'resource': ['project', 'resource'], 'resource-create': ['project'], 'resource-delete': ['project', 'resource'],
+    'link': ['project', 'category', 'context'], 'unlink': ['project', 'category', 'context'],
+    'move': ['project', 'category', 'context', 'context'],
+    'group': ['category'], 'show-cat': ['category'], 'filter': ['category', 'context'],
+    'context-note': ['category', 'context'], 'context-qnote': ['category', 'context'], 'context-qnote-delete': ['category', 'context'],
+    'context-create': ['category', 'context'], 'context-delete': ['category', 'context'], 'archive-context': ['category', 'context'],
+    'category-create': ['category'], 'category-delete': ['category']}
+HISTORY_SUBPATH = '.pm_history'  # compressed snapshots written with every dump inside LOCATION
+HISTORY_LIMIT = 200  # number of snapshots kept, older ones are merged
+CHECK_CACHE = '.pm_check.json'  # directory listings of the last check inside LOCATION
+DISK_CACHE = '.pm_disk.json'  # folder sizes of the last disk scan inside LOCATION
+DISK_WORKERS = 8  # threads scanning the resource folders
+SOCKET_NAME = '.pm.sock'  # unix socket of the daemon inside LOCATION
+DAEMON_COMMANDS = [  # commands that are executed by the daemon when attached, all others only change the view
+    'dump', 'reload', 'backup', 'undo', 'redo', 'create', 'delete', 'link', 'unlink', 'move',
+    'context-create', 'context-delete', 'category-create', 'category-delete', 'resource-create', 'resource-delete',
+    'qnote', 'qnote-delete', 'context-qnote', 'context-qnote-delete', 'archive', 'archive-context', 'bulk-apply', 'check-fix']
 
 class Data:
     """Data loading, dumping and modification"""
-    def __init__(self, LOCATION: Path, Archive=False):
+    def __init__(self, LOCATION: Path, Archive=False, snapshot=None):
         self.LOCATION = LOCATION
         self.Projects = dict()
         self.Contexts = dict()
         self.Archive_Projects = dict()
         self.Archive_Contexts = dict()
         self.Archive_Bool = Archive
-        self.load()
+        self.undo_log = UndoLog()
+        self._journal = None  # inverse operations of the running command
+        self.link_index = LinkIndex()  # projects per context, kept up to date by every modification
+        self.archive_link_index = LinkIndex()
+        self.notes = set()  # paths of existing notes relative to the notes folder
+        self.notes_mtimes = dict()
+        self.cloned_mtimes = dict()
+        self.cloned = dict()  # project -> names of resources that exist in the resources folder
+        self.history = SnapshotStore(LOCATION)
+        if snapshot is None:
+            self.load()
+        else:  # read-only view of an older state
+            self.set_file_state(snapshot)
+            self.scan_files()
     
     # Loading and Dumping
     def load(self):
+        import yaml
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)  # same as safe_load, but much faster with libyaml
+        self.undo_log = UndoLog()
         if not self.Archive_Bool:
             # Load Active
             with open(os.path.join(self.LOCATION,'Active_Projects.yaml'), 'r') as infile:
-                self.Projects = yaml.safe_load(infile)
+                self.Projects = yaml.load(infile, Loader=loader)
             with open(os.path.join(self.LOCATION,'Active_Contexts.yaml'), 'r') as infile:
-                self.Contexts = yaml.safe_load(infile)
+                self.Contexts = yaml.load(infile, Loader=loader)
             
             if not self.Projects:
                 self.Projects = dict()
@@ -114,9 +185,9 @@ class Data:
 
             # Load Archive
             with open(os.path.join(self.LOCATION,'Archive_Projects.yaml'), 'r') as infile:
-                self.Archive_Projects = yaml.safe_load(infile)
+                self.Archive_Projects = yaml.load(infile, Loader=loader)
             with open(os.path.join(self.LOCATION,'Archive_Contexts.yaml'), 'r') as infile:
-                self.Archive_Contexts = yaml.safe_load(infile)
+                self.Archive_Contexts = yaml.load(infile, Loader=loader)
             
             if not self.Archive_Projects:
                 self.Archive_Projects = dict()
@@ -126,9 +197,9 @@ class Data:
         else:  # Switch Archive and Active file
             # Load Active
             with open(os.path.join(self.LOCATION,'Archive_Projects.yaml'), 'r') as infile:
-                self.Projects = yaml.safe_load(infile)
+                self.Projects = yaml.load(infile, Loader=loader)
             with open(os.path.join(self.LOCATION,'Archive_Contexts.yaml'), 'r') as infile:
-                self.Contexts = yaml.safe_load(infile)
+                self.Contexts = yaml.load(infile, Loader=loader)
             
             if not self.Projects:
                 self.Projects = dict()
@@ -137,16 +208,58 @@ class Data:
 
             # Load Archive
             with open(os.path.join(self.LOCATION,'Active_Projects.yaml'), 'r') as infile:
-                self.Archive_Projects = yaml.safe_load(infile)
+                self.Archive_Projects = yaml.load(infile, Loader=loader)
             with open(os.path.join(self.LOCATION,'Active_Contexts.yaml'), 'r') as infile:
-                self.Archive_Contexts = yaml.safe_load(infile)
+                self.Archive_Contexts = yaml.load(infile, Loader=loader)
             
             if not self.Archive_Projects:
                 self.Archive_Projects = dict()
             if not self.Archive_Contexts:
                 self.Archive_Contexts = dict() 
+
+        self.build_index()
+        self.scan_files()
+
+    def build_index(self):
+        self.link_index = LinkIndex(self.Projects)
+        self.archive_link_index = LinkIndex(self.Archive_Projects)
+
+    def scan_files(self):  # find notes and cloned resources once, afterwards they are tracked by the commands
+        self.scan_notes()
+        self.scan_cloned()
+
+    def scan_cloned(self):
+        self.cloned = dict()
+        resources_path = os.path.join(self.LOCATION, RESOURCES_SUBPATH)
+        self.cloned_mtimes = {resources_path: folder_mtime(resources_path)}  # folders of the clones, to notice changes made outside
+        if os.path.isdir(resources_path):
+            for entry in os.scandir(resources_path):
+                if entry.is_dir():
+                    self.cloned_mtimes[entry.path] = folder_mtime(entry.path)
+                    self.cloned[entry.name] = {subentry.name for subentry in os.scandir(entry.path) if subentry.is_dir()}
     
+    def scan_notes(self):
+        self.notes = set()
+        notes_path = os.path.join(self.LOCATION, NOTES_SUBPATH)
+        self.notes_mtimes = {notes_path: folder_mtime(notes_path)}  # folders of the notes, to notice changes made outside
+        if os.path.isdir(notes_path):
+            for entry in os.scandir(notes_path):
+                if entry.is_file() and entry.name.endswith('.md'):
+                    self.notes.add(entry.name)
+                elif entry.is_dir():
+                    self.notes_mtimes[entry.path] = folder_mtime(entry.path)
+                    for subentry in os.scandir(entry.path):
+                        if subentry.is_file() and subentry.name.endswith('.md'):
+                            self.notes.add(os.path.join(entry.name, subentry.name))
+
+    def refresh_files(self):  # scan notes and clones again if they were added or removed outside, e.g. in vscode
+        if any(folder_mtime(path) != mtime for path, mtime in self.notes_mtimes.items()):
+            self.scan_notes()
+        if any(folder_mtime(path) != mtime for path, mtime in self.cloned_mtimes.items()):
+            self.scan_cloned()
+
     def dump(self):
+        import yaml
         if not self.Archive_Bool:
             with open(os.path.join(self.LOCATION,'Active_Projects.yaml'), 'w') as outfile:
                 yaml.dump(self.Projects, outfile)
@@ -165,39 +278,17 @@ class Data:
                 yaml.dump(self.Archive_Projects, outfile)
             with open(os.path.join(self.LOCATION,'Active_Contexts.yaml'), 'w') as outfile:
                 yaml.dump(self.Archive_Contexts, outfile)
+        self.undo_log.mark_saved()
+        self.history.record(self.get_file_state())
 
     # Get Information
     def get_categories(self):  # get all categories
-        all_categories = []
-
-        for proj in self.Projects.keys():
-            if 'links' in self.Projects[proj]:
-                for key in self.Projects[proj]['links'].keys():
-                    if key not in all_categories:
-                        all_categories.append(key)
-        
-        for key in self.Contexts:
-            if key not in all_categories:
-                all_categories.append(key)
-        
-        all_categories.sort()
-        return all_categories
+        all_categories = set(self.link_index.contexts) | set(self.Contexts)
+        return sorted(all_categories)
 
     def get_contexts(self, cat):  # get contexts of a specific category
-        all_contexts = []
-        for proj in self.Projects.keys():
-            if 'links' in self.Projects[proj] and cat in self.Projects[proj]['links']:
-                for context in self.Projects[proj]['links'][cat]:
-                    if context not in all_contexts:
-                        all_contexts.append(context)
-        
-        if cat in self.Contexts:
-            for context in self.Contexts[cat]:
-                if context not in all_contexts:
-                    all_contexts.append(context)
-
-        all_contexts.sort()
-        return all_contexts
+        all_contexts = set(self.link_index.contexts.get(cat, dict())) | set(self.Contexts.get(cat) or dict())
+        return sorted(all_contexts)
 
     def get_resources(self, project):  # list of resources for a project
         assert project in self.Projects
@@ -205,7 +296,7 @@ class Data:
         return self.Projects[project]['resources'].keys() if 'resources' in self.Projects[project] else []
 
     def check_context(self, proj, cat, context):  # check if project links to specific context
-        return proj in self.Projects and 'links' in self.Projects[proj] and cat in self.Projects[proj]['links'] and context in self.Projects[proj]['links'][cat]
+        return proj in self.link_index.projects(cat, context)
 
     def check_no_context(self, proj, cat):  # check if project has no context from that category
         return 'links' not in self.Projects[proj] or cat not in self.Projects[proj]['links'] or not bool(self.Projects[proj]['links'][cat])
@@ -213,25 +304,103 @@ class Data:
     def check_context_in_data(self, cat, context):  # Check if context exists already in data
         return bool(self.Contexts) and cat in self.Contexts and context in self.Contexts[cat]
 
+    def has_project_note(self, project):
+        return str(project) + '.md' in self.notes
+
+    def has_context_note(self, cat, context):
+        return os.path.join(str(cat), str(context) + '.md') in self.notes
+
+    def is_cloned(self, project, resource):
+        return str(resource) in self.cloned.get(str(project), ())
+
+    def context_stats(self, cat, context):  # numbers shown in the category overview
+        projects = self.link_index.projects(cat, context)
+        return {'projects': len(projects),
+                'archived': len(self.archive_link_index.projects(cat, context)),
+                'cloned': sum(1 for proj in projects if self.cloned.get(str(proj))),
+                'note': self.has_context_note(cat, context)}
+
+    def select_projects(self, filters):  # projects linked to all contexts in filters, in the order of Projects
+        if not filters:
+            return list(self.Projects)
+        selected = set.intersection(*[self.link_index.projects(cat, context) for cat, context in filters])
+        return [proj for proj in self.Projects if proj in selected]
+
+    def ungrouped_count(self, cat):  # number of projects without context of that category
+        return len(self.Projects) - self.link_index.linked_count(cat)
+
+    def iter_records(self):  # yield the full data model, one flat record per project/context
+        for kind, projects in [('project', self.Projects), ('archived-project', self.Archive_Projects)]:
+            for proj, content in projects.items():
+                content = content or dict()
+                yield {'kind': kind, 'name': proj, 'category': '', 'qnote': content.get('qnote', ''),
+                       'links': content.get('links') or dict(), 'resources': content.get('resources') or dict()}
+        for kind, contexts in [('context', self.Contexts), ('archived-context', self.Archive_Contexts)]:
+            for cat, cat_contexts in contexts.items():
+                for context, content in (cat_contexts or dict()).items():
+                    content = content or dict()
+                    yield {'kind': kind, 'name': context, 'category': cat, 'qnote': content.get('qnote', ''),
+                           'links': dict(), 'resources': dict()}
+
+    def get_state(self):
+        return {'Projects': self.Projects, 'Contexts': self.Contexts, 'Archive_Projects': self.Archive_Projects, 'Archive_Contexts': self.Archive_Contexts}
+
+    def get_file_state(self):  # state by file name, independent of Archive_Bool
+        state = self.get_state()
+        if not self.Archive_Bool:
+            return {'Active_Projects': state['Projects'], 'Active_Contexts': state['Contexts'],
+                    'Archive_Projects': state['Archive_Projects'], 'Archive_Contexts': state['Archive_Contexts']}
+        return {'Active_Projects': state['Archive_Projects'], 'Active_Contexts': state['Archive_Contexts'],
+                'Archive_Projects': state['Projects'], 'Archive_Contexts': state['Contexts']}
+
+    def set_file_state(self, file_state):
+        if not self.Archive_Bool:
+            self.set_state({'Projects': file_state['Active_Projects'], 'Contexts': file_state['Active_Contexts'],
+                            'Archive_Projects': file_state['Archive_Projects'], 'Archive_Contexts': file_state['Archive_Contexts']})
+        else:
+            self.set_state({'Projects': file_state['Archive_Projects'], 'Contexts': file_state['Archive_Contexts'],
+                            'Archive_Projects': file_state['Active_Projects'], 'Archive_Contexts': file_state['Active_Contexts']})
+
+    def set_state(self, state):
+        self.Projects = state['Projects']
+        self.Contexts = state['Contexts']
+        self.Archive_Projects = state['Archive_Projects']
+        self.Archive_Contexts = state['Archive_Contexts']
+        self.build_index()
+
 
     # Moodification
     def add_project(self, name: str):
         assert name not in self.Projects
         assert name not in self.Archive_Projects
         self.Projects[name] = dict()
+        self._log('remove_project', name)
     
     def remove_project(self, name: str):
         assert name in self.Projects
 
-        del self.Projects[name]
+        pos = list(self.Projects).index(name)
+        self.link_index.remove_project(name, self.Projects[name])
+        self._log('_restore_project', name, self.Projects.pop(name), pos)
+
+    def _restore_project(self, name, content, pos):
+        insert_at(self.Projects, name, content, pos)
+        self.link_index.add_project(name, content)
+        self._log('remove_project', name)
     
     def add_category(self, name):
         if name not in self.Contexts:
             self.Contexts[name] = dict()
+            self._log('remove_category', name)
     
     def remove_category(self, name):
         if name in self.Contexts:
-            del self.Contexts[name]
+            pos = list(self.Contexts).index(name)
+            self._log('_restore_category', name, self.Contexts.pop(name), pos)
+
+    def _restore_category(self, name, content, pos):
+        insert_at(self.Contexts, name, content, pos)
+        self._log('remove_category', name)
     
     def add_context(self, cat, context):
         if cat in self.Archive_Contexts:
@@ -241,48 +410,87 @@ class Data:
             self.add_category(cat)
         if context not in self.Contexts[cat]:
             self.Contexts[cat][context] = dict()
+            self._log('remove_context', cat, context)
     
     def remove_context(self, cat, context):
         assert cat in self.Contexts and context in self.Contexts[cat]
-        del self.Contexts[cat][context]
+        pos = list(self.Contexts[cat]).index(context)
+        self._log('_restore_context', cat, context, self.Contexts[cat].pop(context), pos)
+
+    def _restore_context(self, cat, context, content, pos):
+        insert_at(self.Contexts[cat], context, content, pos)
+        self._log('remove_context', cat, context)
 
     def add_resource(self, proj, res_name, res_type, res_source):
         assert proj in self.Projects
         if 'resources' not in self.Projects[proj]:
-            self.Projects[proj]['resources'] = dict()
+            self._add_empty(proj, 'resources')
         assert res_name not in self.Projects[proj]['resources']
         self.Projects[proj]['resources'][res_name] = {'type': res_type, 'source': res_source}
+        self._log('remove_resource', proj, res_name)
     
     def remove_resource(self, proj, res_name):
         assert proj in self.Projects and res_name in self.Projects[proj]['resources']
-        del self.Projects[proj]['resources'][res_name]
+        pos = list(self.Projects[proj]['resources']).index(res_name)
+        self._log('_restore_resource', proj, res_name, self.Projects[proj]['resources'].pop(res_name), pos)
+
+    def _restore_resource(self, proj, res_name, content, pos):
+        insert_at(self.Projects[proj]['resources'], res_name, content, pos)
+        self._log('remove_resource', proj, res_name)
 
     def link(self, project, category, context):
         assert project in self.Projects
         if 'links' not in self.Projects[project]:
-            self.Projects[project]['links'] = dict()
+            self._add_empty(project, 'links')
         if category not in self.Projects[project]['links']:
             self.Projects[project]['links'][category] = []
         if context not in self.Projects[project]['links'][category]:
             self.Projects[project]['links'][category].append(context)
+            self.link_index.add(project, category, context)
+            self._log('unlink', project, category, context)
+
+    def _add_empty(self, project, key):  # empty 'links' or 'resources' entry
+        self.Projects[project][key] = dict()
+        self._log('_remove_empty', project, key)
+
+    def _remove_empty(self, project, key):
+        assert not self.Projects[project][key]
+        del self.Projects[project][key]
+        self._log('_add_empty', project, key)
     
     def unlink(self, project, category, context):
         assert project in self.Projects
         assert category in self.Projects[project]['links']
         assert context in self.Projects[project]['links'][category]
         
-        self.Projects[project]['links'][category].remove(context)
+        pos = self.Projects[project]['links'][category].index(context)
+        self.Projects[project]['links'][category].pop(pos)
         if len(self.Projects[project]['links'][category]) == 0:
             del self.Projects[project]['links'][category]
+        self.link_index.discard(project, category, context)
+        self._log('_relink', project, category, context, pos)
+
+    def _relink(self, project, category, context, pos):
+        self.link(project, category, context)
+        self.Projects[project]['links'][category].remove(context)
+        self.Projects[project]['links'][category].insert(pos, context)
     
-    def set_qnote_project(self, project, text):
+    def set_qnote_project(self, project, text):  # text None removes the quicknote
         assert project in self.Projects
-        self.Projects[project]['qnote'] = text
+        self._log('set_qnote_project', project, self.Projects[project].get('qnote'))
+        if text is None:
+            self.Projects[project].pop('qnote', None)
+        else:
+            self.Projects[project]['qnote'] = text
     
-    def set_qnote_context(self, category, context, text):
+    def set_qnote_context(self, category, context, text):  # text None removes the quicknote
         assert category in self.Contexts
         assert context in self.Contexts[category]
-        self.Contexts[category][context]['qnote'] = text
+        self._log('set_qnote_context', category, context, self.Contexts[category][context].get('qnote'))
+        if text is None:
+            self.Contexts[category][context].pop('qnote', None)
+        else:
+            self.Contexts[category][context]['qnote'] = text
 
     def open_note_project(self, project):
         assert project in self.Projects
@@ -294,6 +502,7 @@ class Data:
         if not os.path.isfile(file_path):
             with open(file_path, 'w+') as f:
                 pass
+        self.notes.add(filename)
         os.system(f"code -g '{file_path}' -n '{notes_path}'")
 
     def open_note_context(self, category, context):
@@ -311,6 +520,7 @@ class Data:
         if not os.path.isfile(file_path):
             with open(file_path, 'w+') as f:
                 pass
+        self.notes.add(os.path.join(str(category), str(context) + '.md'))
         os.system(f"code -g '{file_path}' -n '{notes_path}'")
 
     def resource_action(self, project, resource, action):
@@ -330,23 +540,44 @@ class Data:
             if not os.path.exists(this_resource_path):  # Make directory
                 os.makedirs(this_resource_path)
             os.system(f"git clone {resource_dict['source']} '{this_resource_path}'")
+            self.cloned.setdefault(str(project), set()).add(str(resource))
             # subprocess.run(["git", "clone",f"{resource_dict['source']}", f"{this_resource_path}"])
             # subprocess.run(f"git clone {resource_dict['source']} '{this_resource_path}'")
         elif action == 'checkout' and resource_dict['type'] == 'SVN':
             if not os.path.exists(this_resource_path):  # Make directory
                 os.makedirs(this_resource_path)
             os.system(f"svn checkout {resource_dict['source']} '{this_resource_path}'")
+            self.cloned.setdefault(str(project), set()).add(str(resource))
         elif action == 'code':
             os.system(f"code '{this_resource_path}'")
         elif action == 'open':
             os.system(f"open '{resource_dict['source']}'")
         else:
             raise ValueError(f"Action {action} is not available for resource of type {resource_dict['type']}")
+
+    def delete_clone(self, project, resource):  # remove the cloned folder of a resource (cannot be undone)
+        project_path = os.path.join(self.LOCATION, RESOURCES_SUBPATH, str(project))
+        assert os.path.isdir(os.path.join(project_path, str(resource)))
+        shutil.rmtree(os.path.join(project_path, str(resource)))
+        self.cloned.get(str(project), set()).discard(str(resource))
+        if not os.listdir(project_path):
+            os.rmdir(project_path)
+            self.cloned.pop(str(project), None)
     
     def archive_project(self, project):
         assert project in self.Projects
         assert project not in self.Archive_Projects
+        pos = list(self.Projects).index(project)
         self.Archive_Projects[project] = self.Projects.pop(project)
+        self.link_index.remove_project(project, self.Archive_Projects[project])
+        self.archive_link_index.add_project(project, self.Archive_Projects[project])
+        self._log('_unarchive_project', project, pos)
+
+    def _unarchive_project(self, project, pos):
+        insert_at(self.Projects, project, self.Archive_Projects.pop(project), pos)
+        self.archive_link_index.remove_project(project, self.Projects[project])
+        self.link_index.add_project(project, self.Projects[project])
+        self._log('archive_project', project)
     
     def archive_context(self, category, context):
         assert bool(self.Contexts) and category in self.Contexts and context in self.Contexts[category]
@@ -354,12 +585,725 @@ class Data:
             assert context not in self.Archive_Contexts[category]
         else:
             self.Archive_Contexts[category] = dict()
+        pos = list(self.Contexts[category]).index(context)
         self.Archive_Contexts[category][context] = self.Contexts[category].pop(context)
+        self._log('_unarchive_context', category, context, pos)
+
+    def _unarchive_context(self, category, context, pos):
+        content = self.Archive_Contexts[category].pop(context)
+        if len(self.Archive_Contexts[category]) == 0:
+            del self.Archive_Contexts[category]
+        insert_at(self.Contexts[category], context, content, pos)
+        self._log('archive_context', category, context)
+
+    def repair_project(self, project):  # remove empty (None) entries written by hand
+        old = self.Projects[project]
+        new = dict(old or dict())
+        if 'links' in new:
+            new['links'] = {cat: contexts for cat, contexts in (new['links'] or dict()).items() if contexts}
+        for key in ['links', 'resources']:
+            if key in new and not new[key]:
+                del new[key]
+        self._replace_project(project, new)
+
+    def _replace_project(self, project, content):
+        self.link_index.remove_project(project, self.Projects[project])
+        self._log('_replace_project', project, self.Projects[project])
+        self.Projects[project] = content
+        self.link_index.add_project(project, content)
+
+    def repair_category(self, cat):  # empty (None) contexts and categories become empty dicts
+        self._replace_category(cat, {context: content or dict() for context, content in (self.Contexts[cat] or dict()).items()})
+
+    def _replace_category(self, cat, content):
+        self._log('_replace_category', cat, self.Contexts[cat])
+        self.Contexts[cat] = content
+
+    def bulk(self, action, params, projects):  # same modification for many projects
+        assert action in BULK_ACTIONS
+        for proj in projects:
+            if action == 'link':
+                self.link(proj, params[0], params[1])
+            elif action == 'unlink':
+                self.unlink(proj, params[0], params[1])
+            elif action == 'move':
+                self.unlink(proj, params[0], params[1])
+                self.link(proj, params[0], params[2])
+            elif action == 'archive':
+                self.archive_project(proj)
+            elif action == 'qnote':
+                self.set_qnote_project(proj, ' '.join(params))
+
+    # Undo and Redo
+    def _log(self, method, *args):  # record the inverse operation of a modification
+        if self._journal is not None:
+            self._journal.append((method, args))
+
+    def _replay(self, ops):  # apply recorded inverse operations, last one first
+        for method, args in reversed(ops):
+            getattr(self, method)(*args)
+
+    @contextmanager
+    def transaction(self, label):
+        """All modifications inside are undone together. Nothing is kept if an exception is raised."""
+        if self._journal is not None:  # part of an outer transaction
+            yield
+            return
+        self._journal = []
+        try:
+            yield
+        except BaseException:
+            ops, self._journal = self._journal, None
+            self._replay(ops)
+            raise
+        ops, self._journal = self._journal, None
+        if ops:
+            self.undo_log.push(label, ops)
+
+    def undo(self):
+        assert self.undo_log.undo_stack, 'Nothing to undo'
+        ident, label, ops = self.undo_log.undo_stack.pop()
+        self._journal = []
+        try:
+            self._replay(ops)
+        finally:
+            inverse, self._journal = self._journal, None
+        self.undo_log.redo_stack.append((ident, label, inverse))
+        return label
+
+    def redo(self):
+        assert self.undo_log.redo_stack, 'Nothing to redo'
+        ident, label, ops = self.undo_log.redo_stack.pop()
+        self._journal = []
+        try:
+            self._replay(ops)
+        finally:
+            inverse, self._journal = self._journal, None
+        self.undo_log.append((ident, label, inverse))
+        return label
+
+
+class LinkIndex:
+    """Projects per context and number of linked contexts per project and category"""
+    def __init__(self, projects=None):
+        self.contexts = dict()  # category -> context -> set of projects
+        self.linked = dict()  # category -> project -> number of linked contexts
+        for project, content in (projects or dict()).items():
+            self.add_project(project, content)
+
+    def add(self, project, category, context):
+        members = self.contexts.setdefault(category, dict()).setdefault(context, set())
+        if project not in members:
+            members.add(project)
+            counts = self.linked.setdefault(category, dict())
+            counts[project] = counts.get(project, 0) + 1
+
+    def discard(self, project, category, context):
+        members = self.contexts.get(category, dict()).get(context, set())
+        if project in members:
+            members.remove(project)
+            if not members:
+                del self.contexts[category][context]
+                if not self.contexts[category]:
+                    del self.contexts[category]
+            self.linked[category][project] -= 1
+            if self.linked[category][project] == 0:
+                del self.linked[category][project]
+                if not self.linked[category]:
+                    del self.linked[category]
+
+    def add_project(self, project, content):
+        for category, contexts in ((content or dict()).get('links') or dict()).items():
+            for context in contexts or []:
+                self.add(project, category, context)
+
+    def remove_project(self, project, content):
+        for category, contexts in ((content or dict()).get('links') or dict()).items():
+            for context in contexts or []:
+                self.discard(project, category, context)
+
+    def projects(self, category, context):
+        return self.contexts.get(category, dict()).get(context, set())
+
+    def linked_count(self, category):  # number of projects with at least one context of that category
+        return len(self.linked.get(category, dict()))
+
+
+class UndoLog:
+    """Inverse operations of the last UNDO_DEPTH commands, as long as they fit into UNDO_BUDGET"""
+    def __init__(self, depth=UNDO_DEPTH, budget=UNDO_BUDGET):
+        self.undo_stack = deque(maxlen=depth)  # entries: (id, label, inverse operations)
+        self.redo_stack = deque(maxlen=depth)
+        self.budget = budget
+        self.sizes = dict()  # id -> estimated bytes of the entries in both stacks
+        self.counter = 0  # id of the last recorded command
+        self.base = 0  # state when the undo stack is empty
+        self.saved = 0  # state of the files
+
+    def state(self):
+        return self.undo_stack[-1][0] if self.undo_stack else self.base
+
+    def drop_oldest(self):
+        self.base = self.undo_stack.popleft()[0]
+        self.sizes.pop(self.base, None)
+
+    def append(self, entry):
+        if len(self.undo_stack) == self.undo_stack.maxlen:
+            self.drop_oldest()
+        self.undo_stack.append(entry)
+        self.sizes[entry[0]] = estimate_size(entry[2])
+        while len(self.undo_stack) > 1 and sum(self.sizes.values()) > self.budget:
+            self.drop_oldest()
+
+    def push(self, label, ops):  # new command, the redo stack becomes invalid
+        for entry in self.redo_stack:
+            self.sizes.pop(entry[0], None)
+        self.redo_stack.clear()
+        self.counter += 1
+        self.append((self.counter, label, ops))
+
+    def drop_redo(self):  # forget the last undone command
+        self.sizes.pop(self.redo_stack.pop()[0], None)
+
+    def mark_saved(self):
+        self.saved = self.state()
+
+    def dirty(self):
+        return self.state() != self.saved
+
+
+def folder_mtime(path):  # None if the folder does not exist
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def estimate_size(value):  # rough bytes used by nested dicts, lists and their values
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+def parse_bulk(args):  # action, params and filters (None: current filters) of a bulk command without 'bulk'
+    action = args[0]
+    assert action in BULK_ACTIONS
+    if BULK_ACTIONS[action] is None:  # the text may contain @, so filters come first and end with --
+        if len(args) > 1 and args[1] == '@':
+            assert '--' in args, f"Use: bulk {action} @ <CATEGORY> <CONTEXT> ... -- <TEXT>"
+            idx = args.index('--')
+            filter_args, params = args[1:idx], args[idx + 1:]
+        else:
+            filter_args, params = [], args[1:]
+    else:  # @ only after the fixed number of arguments
+        params, filter_args = args[1:1 + BULK_ACTIONS[action]], args[1 + BULK_ACTIONS[action]:]
+        assert len(params) == BULK_ACTIONS[action], f"bulk {action} needs {BULK_ACTIONS[action]} arguments"
+    if not filter_args:
+        return action, params, None
+    assert filter_args[0] == '@' and len(filter_args) % 2 == 1, 'Filters are given as @ <CATEGORY> <CONTEXT> ...'
+    return action, params, [filter_args[i:i+2] for i in range(1, len(filter_args), 2)]
+
+def bulk_command(action, params, filters):  # inverse of parse_bulk
+    filter_args = ['@'] + [part for f in filters for part in f]
+    if BULK_ACTIONS[action] is None:
+        return [action] + filter_args + ['--'] + params
+    return [action] + params + filter_args
+
+def insert_at(dictionary, key, value, pos):  # insert key at position pos and keep the order of the rest
+    tail = [(k, dictionary.pop(k)) for k in list(dictionary)[pos:]]
+    dictionary[key] = value
+    dictionary.update(tail)
+
+class MergedDict(Mapping):
+    """Read-only union of dicts, the first dict with a key wins. With depth 1 the values are merged as well."""
+    def __init__(self, dicts, depth=0):
+        self.dicts = dicts
+        self.depth = depth
+
+    def __getitem__(self, key):
+        if self.depth:
+            values = [d[key] for d in self.dicts if key in d]
+            if not values:
+                raise KeyError(key)
+            return MergedDict([value for value in values if value is not None], self.depth - 1)
+        for d in self.dicts:
+            if key in d:
+                return d[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        seen = set()
+        for d in self.dicts:
+            for key in d:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __len__(self):
+        return len(set().union(*self.dicts))
+
+
+class Federation:
+    """Several workspaces shown together. Reading merges the Data of all workspaces,
+    modifications are done by the workspace that owns the project or context (see FederatedCommandParser)."""
+    def __init__(self, workspaces):
+        self.workspaces = workspaces  # tag -> Data, in the order of the command line
+        self.LOCATION = next(iter(workspaces.values())).LOCATION
+        self.target = next(iter(workspaces))  # workspace for new projects, contexts and categories
+        self.undo_order = deque(maxlen=UNDO_DEPTH)  # (tag, undo log id) of the workspaces modified by each of the last commands
+        self.redo_order = deque(maxlen=UNDO_DEPTH)
+        duplicates = self.duplicates()
+        if duplicates:
+            raise ValueError('Projects in several workspaces: ' + ', '.join(f"{proj} ({', '.join(tags)})" for proj, tags in duplicates.items()))
+
+    @property
+    def Projects(self):
+        return MergedDict([data.Projects for data in self.workspaces.values()])
+
+    @property
+    def Contexts(self):
+        return MergedDict([data.Contexts for data in self.workspaces.values()], depth=1)
+
+    def duplicates(self):  # project name -> tags, for names used by several workspaces (only the first would be shown)
+        tags = dict()
+        for tag, data in self.workspaces.items():
+            for proj in data.Projects:
+                tags.setdefault(proj, []).append(tag)
+        return {proj: owners for proj, owners in tags.items() if len(owners) > 1}
+
+    def last_step(self, order, stack):  # last command of order still in the undo logs, entries dropped by the budget are forgotten
+        while order:
+            step = [(tag, ident) for tag, ident in order[-1]
+                    if any(entry[0] == ident for entry in getattr(self.workspaces[tag].undo_log, stack))]
+            if step:
+                return step
+            order.pop()
+        return None
+
+    def owner(self, project):  # tag of the workspace that has the project
+        for tag, data in self.workspaces.items():
+            if project in data.Projects:
+                return tag
+        raise KeyError(project)
+
+    def route(self, args, mode, mode_content):  # Data that executes a command
+        if args[0] in ['resource', 'resource-create', 'resource-delete'] and mode == 'open' and mode_content in self.Projects:
+            return self.workspaces[self.owner(mode_content)]
+        if USAGE_ARGS.get(args[0], [None])[0] == 'project' and len(args) > 1 and args[1] in self.Projects:
+            return self.workspaces[self.owner(args[1])]
+        if args[0] in ['context-delete', 'context-note', 'context-qnote', 'context-qnote-delete', 'archive-context'] and len(args) > 2:
+            for data in self.workspaces.values():
+                if data.check_context_in_data(args[1], args[2]):
+                    return data
+        if args[0] == 'category-delete' and len(args) > 1:
+            for data in self.workspaces.values():
+                if args[1] in data.Contexts:
+                    return data
+        return self.workspaces[self.target]
+
+    def workspace_of(self, project):
+        return self.owner(project)
+
+    def get_categories(self):
+        return sorted(set().union(*[data.get_categories() for data in self.workspaces.values()]))
+
+    def get_contexts(self, cat):
+        return sorted(set().union(*[data.get_contexts(cat) for data in self.workspaces.values()]))
+
+    def get_resources(self, project):
+        return self.workspaces[self.owner(project)].get_resources(project)
+
+    def check_context(self, proj, cat, context):
+        return self.workspaces[self.owner(proj)].check_context(proj, cat, context)
+
+    def check_no_context(self, proj, cat):
+        return self.workspaces[self.owner(proj)].check_no_context(proj, cat)
+
+    def check_context_in_data(self, cat, context):
+        return any(data.check_context_in_data(cat, context) for data in self.workspaces.values())
+
+    def has_project_note(self, project):
+        return self.workspaces[self.owner(project)].has_project_note(project)
+
+    def has_context_note(self, cat, context):
+        return any(data.has_context_note(cat, context) for data in self.workspaces.values())
+
+    def refresh_files(self):
+        for data in self.workspaces.values():
+            data.refresh_files()
+
+    def is_cloned(self, project, resource):
+        return self.workspaces[self.owner(project)].is_cloned(project, resource)
+
+    def context_stats(self, cat, context):
+        stats = [data.context_stats(cat, context) for data in self.workspaces.values()]
+        return {'projects': sum(s['projects'] for s in stats), 'archived': sum(s['archived'] for s in stats),
+                'cloned': sum(s['cloned'] for s in stats), 'note': any(s['note'] for s in stats)}
+
+    def select_projects(self, filters):
+        selected = []
+        seen = set()
+        for data in self.workspaces.values():
+            for proj in data.select_projects(filters):
+                if proj not in seen:
+                    seen.add(proj)
+                    selected.append(proj)
+        return selected
+
+    def ungrouped_count(self, cat):  # like select_projects, names shadowed by an earlier workspace are not counted
+        count = 0
+        seen = set()
+        for data in self.workspaces.values():
+            shadowed = seen & data.Projects.keys()
+            count += data.ungrouped_count(cat) - len(shadowed - data.link_index.linked.get(cat, dict()).keys())
+            seen.update(data.Projects)
+        return count
+
+    def iter_records(self):
+        for tag, data in self.workspaces.items():
+            for rec in data.iter_records():
+                rec['workspace'] = tag
+                yield rec
+
+
+def workspace_tags(locations):  # folder names, made unique with a number
+    tags = []
+    for location in locations:
+        tag, number = location.name, 2
+        while tag in tags:
+            tag = f"{location.name}-{number}"
+            number += 1
+        tags.append(tag)
+    return tags
+
+
+class IntegrityChecker:
+    """Checks links, notes and resource folders. Directory listings are cached by mtime, so only changed folders are scanned again."""
+    def __init__(self, data: Data):
+        self.data = data
+        self.cache_path = os.path.join(data.LOCATION, CHECK_CACHE)
+        self.listings = dict()  # folder relative to LOCATION -> [mtime, [[name, is_dir], ...]]
+        if os.path.isfile(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as infile:
+                    self.listings = json.load(infile)
+            except ValueError:  # broken cache is simply rebuilt
+                self.listings = dict()
+
+    def listing(self, *parts):  # [(name, is_dir)] of a folder, scanned only if its mtime changed
+        rel_path = os.path.join(*parts)
+        try:
+            mtime = os.stat(os.path.join(self.data.LOCATION, rel_path)).st_mtime_ns
+        except FileNotFoundError:
+            self.listings.pop(rel_path, None)
+            return []
+        if rel_path not in self.listings or self.listings[rel_path][0] != mtime:
+            entries = [[entry.name, entry.is_dir()] for entry in os.scandir(os.path.join(self.data.LOCATION, rel_path))]
+            self.listings[rel_path] = [mtime, entries]
+        return self.listings[rel_path][1]
+
+    def check(self):
+        """Returns a list of (problem, fix), fix is (method of Data, args) or None if it needs manual work."""
+        data = self.data
+        issues = []
+        for proj, content in data.Projects.items():
+            if content is None or any(content.get(key, dict()) is None for key in ['links', 'resources']) or any(not contexts for contexts in (content.get('links') or dict()).values()):
+                issues.append((f"Project {proj} has empty entries", ('repair_project', (proj,))))
+        for cat, contexts in data.Contexts.items():
+            if contexts is None or any(content is None for content in contexts.values()):
+                issues.append((f"Category {cat} has empty entries", ('repair_category', (cat,))))
+
+        for cat, contexts in data.link_index.contexts.items():  # links to archived contexts
+            for context, projects in contexts.items():
+                if context in (data.Archive_Contexts.get(cat) or dict()) and not data.check_context_in_data(cat, context):
+                    for proj in projects:
+                        issues.append((f"Project {proj} links to archived context {cat}: {context}", ('unlink', (proj, cat, context))))
+
+        all_projects = {str(proj) for proj in data.Projects} | {str(proj) for proj in data.Archive_Projects}
+        for name, is_dir in self.listing(NOTES_SUBPATH):
+            if not is_dir and name.endswith('.md') and name[:-3] not in all_projects:
+                issues.append((f"Note {os.path.join(NOTES_SUBPATH, name)} has no project", None))
+            elif is_dir:
+                contexts = {str(context) for context in (data.Contexts.get(name) or dict())} | {str(context) for context in (data.Archive_Contexts.get(name) or dict())}
+                for subname, sub_is_dir in self.listing(NOTES_SUBPATH, name):
+                    if not sub_is_dir and subname.endswith('.md') and subname[:-3] not in contexts:
+                        issues.append((f"Note {os.path.join(NOTES_SUBPATH, name, subname)} has no context", None))
+
+        all_resources = {str(proj): {str(res) for res in ((content or dict()).get('resources') or dict())} for proj, content in list(data.Projects.items()) + list(data.Archive_Projects.items())}
+        for name, is_dir in self.listing(RESOURCES_SUBPATH):
+            if is_dir and name not in all_resources:
+                issues.append((f"Resource folder {os.path.join(RESOURCES_SUBPATH, name)} has no project", None))
+            elif is_dir:
+                for subname, sub_is_dir in self.listing(RESOURCES_SUBPATH, name):
+                    if sub_is_dir and subname not in all_resources[name]:
+                        issues.append((f"Resource folder {os.path.join(RESOURCES_SUBPATH, name, subname)} has no resource", None))
+
+        with open(self.cache_path, 'w') as outfile:
+            json.dump(self.listings, outfile)
+        return issues
+
+    def fix(self, issues):  # apply the fixes of the data problems
+        for problem, fix in issues:
+            if fix is not None:
+                getattr(self.data, fix[0])(*fix[1])
+
+
+class SnapshotStore:
+    """History of dumped states. Every snapshot is a gzipped delta (changed and deleted projects/categories) to the one before,
+    the oldest snapshot holds the full state."""
+    SECTIONS = ['Active_Projects', 'Active_Contexts', 'Archive_Projects', 'Archive_Contexts']
+
+    def __init__(self, LOCATION):
+        self.path = os.path.join(LOCATION, HISTORY_SUBPATH)
+        self.last_state = None  # state of the newest snapshot, reconstructed when needed
+
+    def snapshots(self):  # timestamps (ms) of all snapshots, oldest first
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(entry.name.split('.')[0]) for entry in os.scandir(self.path) if entry.name.endswith('.yaml.gz'))
+
+    def read(self, stamp):  # yaml keeps the types of keys like years, json would turn them into strings
+        import yaml
+        with gzip.open(os.path.join(self.path, f"{stamp}.yaml.gz"), 'rt') as infile:
+            return yaml.load(infile, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+    def write(self, stamp, delta):
+        import yaml
+        with gzip.open(os.path.join(self.path, f"{stamp}.yaml.gz"), 'wt') as outfile:
+            yaml.dump(delta, outfile, Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), sort_keys=False)
+
+    @staticmethod
+    def apply(state, delta):
+        for section, items in delta['set'].items():
+            for key, value in items:
+                state[section][key] = value
+        for section, keys in delta['del'].items():
+            for key in keys:
+                state[section].pop(key, None)
+
+    @classmethod
+    def diff(cls, old, new):
+        delta = {'set': dict(), 'del': dict()}
+        for section in cls.SECTIONS:
+            changed = [[key, value] for key, value in new[section].items() if key not in old[section] or old[section][key] != value]
+            deleted = [key for key in old[section] if key not in new[section]]
+            if changed:
+                delta['set'][section] = changed
+            if deleted:
+                delta['del'][section] = deleted
+        return delta
+
+    def state_at(self, stamp):  # full state of the snapshot with that timestamp
+        state = {section: dict() for section in self.SECTIONS}
+        for snapshot in self.snapshots():
+            if snapshot > stamp:
+                break
+            self.apply(state, self.read(snapshot))
+        return state
+
+    def record(self, state):
+        stamps = self.snapshots()
+        if self.last_state is None:
+            self.last_state = self.state_at(stamps[-1]) if stamps else {section: dict() for section in self.SECTIONS}
+        delta = self.diff(self.last_state, state)
+        if not delta['set'] and not delta['del']:
+            return
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        stamp = max(time.time_ns() // 1000000, stamps[-1] + 1 if stamps else 0)
+        self.write(stamp, delta)
+        self.last_state = copy.deepcopy(state)
+        self.prune(stamps + [stamp])
+
+    def prune(self, stamps):  # merge the oldest snapshots into the next one
+        if len(stamps) <= HISTORY_LIMIT:
+            return
+        first_kept = stamps[-HISTORY_LIMIT]
+        state = self.state_at(first_kept)
+        self.write(first_kept, {'set': {section: [[key, value] for key, value in state[section].items()] for section in self.SECTIONS}, 'del': dict()})
+        for stamp in stamps[:-HISTORY_LIMIT]:
+            os.remove(os.path.join(self.path, f"{stamp}.yaml.gz"))
+
+    def find(self, when):  # snapshot for a number from the history list or the latest one at an ISO time
+        stamps = self.snapshots()
+        assert stamps, 'No snapshots yet, they are written with every dump'
+        if when.isdigit() and int(when) < len(stamps):
+            return stamps[int(when)]
+        limit = datetime.fromisoformat(when).timestamp() * 1000
+        earlier = [stamp for stamp in stamps if stamp <= limit]
+        assert earlier, f"No snapshot before {when}"
+        return earlier[-1]
+
+    def summary(self):  # one row per snapshot
+        rows = []
+        for i, stamp in enumerate(self.snapshots()):
+            delta = self.read(stamp)
+            changed = sum(len(items) for items in delta['set'].values())
+            deleted = sum(len(keys) for keys in delta['del'].values())
+            rows.append(f" {i:>3}  {datetime.fromtimestamp(stamp / 1000).isoformat(sep=' ', timespec='seconds')}  {changed} changed, {deleted} deleted")
+        return rows
+
+
+class Frecency:
+    """How often and how recently names were used. Each use adds 1, the scores halve every FRECENCY_HALF_LIFE."""
+    def __init__(self, LOCATION):
+        self.path = os.path.join(LOCATION, FRECENCY_CACHE)
+        self.scores = dict()  # key -> [score, time of the last use]
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, 'r') as infile:
+                    self.scores = json.load(infile)
+            except ValueError:  # broken cache, start again
+                self.scores = dict()
+
+    @staticmethod
+    def key(kind, *names):
+        return '\t'.join([kind] + [str(name) for name in names])
+
+    def score(self, now, kind, *names):
+        score, last = self.scores.get(self.key(kind, *names), (0.0, now))
+        return score * 0.5 ** ((now - last) / FRECENCY_HALF_LIFE)
+
+    def use(self, kind, *names):
+        now = time.time()
+        self.scores[self.key(kind, *names)] = [self.score(now, kind, *names) + 1, now]
+
+    def save(self):  # keep only the FRECENCY_SIZE highest scores
+        now = time.time()
+        decayed = {key: score * 0.5 ** ((now - last) / FRECENCY_HALF_LIFE) for key, (score, last) in self.scores.items()}
+        keep = sorted(decayed, key=decayed.get, reverse=True)[:FRECENCY_SIZE]
+        self.scores = {key: self.scores[key] for key in keep}
+        with open(self.path, 'w') as outfile:
+            json.dump(self.scores, outfile)
+
+
+class DiskScanner:
+    """Disk usage of the cloned resources, computed in a background thread. Folders whose mtime did not change
+    are not listed again, so files that only grew are noticed when something in their folder is added or removed."""
+    def __init__(self, LOCATION, on_update=None):
+        self.LOCATION = LOCATION
+        self.cache_path = os.path.join(LOCATION, DISK_CACHE)
+        self.on_update = on_update  # called from the scanning thread when a scan is finished
+        self.folders = dict()  # folder relative to LOCATION -> [mtime, size of the files, [subfolders]]
+        if os.path.isfile(self.cache_path):
+            try:
+                with open(self.cache_path, 'r') as infile:
+                    self.folders = json.load(infile)
+            except ValueError:  # broken cache is simply rebuilt
+                self.folders = dict()
+        self.sizes = None  # project -> resource -> bytes, None until the first scan is finished
+        self.orphans = []  # (project, resource, reason) of clones without active project or resource
+        self.thread = None
+
+    def scanning(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, projects, archived):  # projects: project -> names of its resources, archived: names of archived projects
+        if self.scanning():
+            return
+        self.thread = threading.Thread(target=self.scan, args=(projects, archived), daemon=True)
+        self.thread.start()
+
+    def folder_size(self, rel_path, folders):  # bytes on disk of a folder, folders collects the visited ones
+        full_path = os.path.join(self.LOCATION, rel_path)
+        try:
+            mtime = os.stat(full_path, follow_symlinks=False).st_mtime_ns
+            cached = self.folders.get(rel_path)
+            if cached is None or cached[0] != mtime:
+                files_size, subfolders = 0, []
+                for entry in os.scandir(full_path):
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.name)
+                    else:
+                        files_size += entry.stat(follow_symlinks=False).st_blocks * 512
+                cached = [mtime, files_size, subfolders]
+        except OSError:  # removed while scanning or not readable
+            return 0
+        folders[rel_path] = cached
+        return cached[1] + sum(self.folder_size(os.path.join(rel_path, sub), folders) for sub in cached[2])
+
+    def scan(self, projects, archived):
+        clones = []
+        resources_path = os.path.join(self.LOCATION, RESOURCES_SUBPATH)
+        if os.path.isdir(resources_path):
+            for entry in os.scandir(resources_path):
+                if entry.is_dir(follow_symlinks=False):
+                    clones += [(entry.name, subentry.name) for subentry in os.scandir(entry.path) if subentry.is_dir(follow_symlinks=False)]
+
+        from concurrent.futures import ThreadPoolExecutor
+        folders = dict()  # only folders that still exist are kept in the cache
+        with ThreadPoolExecutor(max_workers=DISK_WORKERS) as pool:
+            results = list(pool.map(lambda clone: self.folder_size(os.path.join(RESOURCES_SUBPATH, *clone), folders), clones))
+        sizes = dict()
+        orphans = []
+        for (proj, res), size in zip(clones, results):
+            sizes.setdefault(proj, dict())[res] = size
+            if proj in projects:
+                if res not in projects[proj]:
+                    orphans.append((proj, res, 'deleted resource'))
+            else:
+                orphans.append((proj, res, 'archived project' if proj in archived else 'deleted project'))
+        self.folders, self.sizes, self.orphans = folders, sizes, orphans
+
+        try:
+            with open(self.cache_path, 'w') as outfile:
+                json.dump(self.folders, outfile)
+        except OSError:  # the cache is only an optimization
+            pass
+        if self.on_update is not None:
+            self.on_update()
+
+
+def format_size(size):  # bytes as short text
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024:
+            return f"{size} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def flat_value(value):  # flatten links/resources for csv and markdown
+    if isinstance(value, dict):
+        parts = []
+        for key, val in value.items():
+            if isinstance(val, dict):  # resource
+                parts.append(f"{key} ({val.get('type', '')}: {val.get('source', '')})")
+            elif isinstance(val, list):  # link
+                parts.append(f"{key}: {', '.join(str(v) for v in val)}")
+        return '; '.join(parts)
+    if value is None:
+        return ''
+    return str(value)
+
+def write_records(records, fields, fmt, outfile):
+    """Write records one by one, so that nothing but the current record is kept in memory."""
+    if fmt == 'jsonl':
+        for rec in records:
+            outfile.write(json.dumps(rec, default=str) + '\n')
+    elif fmt == 'csv':
+        writer = csv.DictWriter(outfile, fieldnames=fields)
+        writer.writeheader()
+        for rec in records:
+            writer.writerow({key: flat_value(rec[key]) for key in fields})
+    elif fmt == 'md':  # heading for the first field, bullet for the second, the rest in brackets
+        group = None
+        first = True
+        for rec in records:
+            if rec[fields[0]] != group:
+                group = rec[fields[0]]
+                if group != '':
+                    outfile.write(('' if first else '\n') + f"# {group}\n")
+            first = False
+            details = [f"{key}: {flat_value(rec[key])}" for key in fields[2:] if flat_value(rec[key]) not in ['', 'False']]
+            outfile.write(f"- {rec[fields[1]]}" + (f" ({'; '.join(details)})" if details else '') + '\n')
+    else:
+        raise ValueError(f"Format {fmt} is not available for export")
 
 
 class TUIManager:
     """Manages how to show the data."""
     def __init__(self, DATA: Data):
+        self.DATA = DATA  # current data, CONTENT is a snapshot in view-at mode
         self.CONTENT = DATA
         self.mode = 'group'  # Can be show or group 
         self.mode_content = '*'  # Category or Project
@@ -372,11 +1316,23 @@ class TUIManager:
 
         self.cat_list_visible = False # category and context list
         self.cat_list_line = 0
+        self.cat_list_sort = 'name'  # sort contexts by name or by number of projects
 
         self.show_resources = False  # show resources in group view
         self.show_cats = []
+        self.attached = False  # modifications are done by a daemon
+        self.daemon_version = None  # version of the daemon state mirrored in CONTENT
+        self.bulk_pending = None  # (args, projects) of a bulk command waiting for bulk-apply
+        self.report = None  # (title, rows) shown instead of the main view until the next command
+        self.checker = None  # IntegrityChecker per workspace, created with the first check
+        self.frecency = None  # Frecency for the order of completions (alphabetical if None)
+        self.view_at = None  # timestamp of the snapshot shown instead of the current data (read-only)
+        self.disk = None  # DiskScanner per workspace, created with the first disk scan
+        self.disk_sort = 'size'  # sort the disk report by size or name
+        self.prune_pending = None  # [(workspace, project, resource, reason)] of disk-prune waiting for disk-prune-apply
+        self.on_disk_update = None  # set by the TUI to redraw when a background scan is finished
     
-    def context_str(self, cat, context):
+    def context_str(self, cat, context, show_stats=False):
         exists_in_file = ' [?]'
         qnote = ''
         if self.CONTENT.check_context_in_data(cat, context):
@@ -384,16 +1340,25 @@ class TUIManager:
             if 'qnote' in self.CONTENT.Contexts[cat][context] and self.CONTENT.Contexts[cat][context]['qnote'] != '':
                 qnote = '  (' + self.CONTENT.Contexts[cat][context]['qnote'] + ')'
         
-        notepath = os.path.join(self.CONTENT.LOCATION, NOTES_SUBPATH, str(cat), str(context) + '.md')
-        note = ' [N]' if os.path.isfile(notepath) else ''
-
-        return f"<ansigreen>{context}</ansigreen>{note}{exists_in_file}{qnote}"
+        note = ' [N]' if self.CONTENT.has_context_note(cat, context) else ''
+
+        stats = ''
+        if show_stats:
+            numbers = self.CONTENT.context_stats(cat, context)
+            stats_lst = [f"{numbers['projects']} projects"]
+            if numbers['archived']:
+                stats_lst.append(f"{numbers['archived']} archived")
+            if numbers['cloned']:
+                stats_lst.append(f"{numbers['cloned']} cloned")
+            stats = f" <ansibrightblack>[{', '.join(stats_lst)}]</ansibrightblack>"
+
+        return f"<ansigreen>{context}</ansigreen>{stats}{note}{exists_in_file}{qnote}"
     
     def project_str(self, project):
         assert project in self.CONTENT.Projects
         qnote = ''
         showcats = ''
-        note = ' [N]' if os.path.isfile(os.path.join(os.path.join(self.CONTENT.LOCATION, NOTES_SUBPATH), str(project) + '.md')) else ''
+        note = ' [N]' if self.CONTENT.has_project_note(project) else ''
         if 'qnote' in self.CONTENT.Projects[project] and self.CONTENT.Projects[project]['qnote'] != '':
             qnote = '  (' + self.CONTENT.Projects[project]['qnote'] + ')'
         showcats_lst = []
@@ -403,8 +1368,9 @@ class TUIManager:
                     showcats_lst.append(f"{cat}: {', '.join(self.CONTENT.Projects[project]['links'][cat])}")
         if len(showcats_lst) != 0:
             showcats = ' (' + '; '.join(showcats_lst) + ')'
+        workspace = f" <ansimagenta>[{self.CONTENT.workspace_of(project)}]</ansimagenta>" if self.federated() else ''
 
-        return f"<ansicyan>{project}</ansicyan>{note}<ansibrightblack>{showcats}</ansibrightblack>{qnote}"
+        return f"<ansicyan>{project}</ansicyan>{workspace}{note}<ansibrightblack>{showcats}</ansibrightblack>{qnote}"
     
     def resources_str(self, project, resource):
         assert project in self.CONTENT.Projects
@@ -413,33 +1379,206 @@ class TUIManager:
 
         resource_dict = self.CONTENT.Projects[project]['resources'][resource]
 
-        gen_resource_path = os.path.join(self.CONTENT.LOCATION, RESOURCES_SUBPATH)
-        this_resource_path = os.path.join(gen_resource_path, project, resource)
-
         cloned = ''
-        if os.path.exists(this_resource_path):
-            cloned = " [C]"
+        if self.CONTENT.is_cloned(project, resource):
+            size = self.disk_size(project, resource)
+            cloned = " [C]" if size is None else f" [C {format_size(size)}]"
         
         return f"{resource_dict['type']}: <ansiyellow>{resource}</ansiyellow>{cloned} ({resource_dict['source']})"
 
+    def federated(self):  # several workspaces are shown
+        return isinstance(self.CONTENT, Federation)
+
+    def workspaces(self):  # tag -> Data of the shown workspaces (tag '' if there is only one)
+        return self.CONTENT.workspaces if self.federated() else {'': self.CONTENT}
+
+    def live_workspaces(self):  # like workspaces, but never a snapshot
+        return self.DATA.workspaces if isinstance(self.DATA, Federation) else {'': self.DATA}
+
+    def matches_filter(self, proj):  # check if project passes all filters
+        return all([self.CONTENT.check_context(proj,f1,f2) for f1,f2 in self.filter])
+
+    def project_record(self, group, proj):
+        content = self.CONTENT.Projects[proj]
+        record = {'group': group, 'project': proj, 'qnote': content.get('qnote', ''),
+                  'links': content.get('links') or dict(), 'resources': content.get('resources') or dict()}
+        if self.federated():
+            record['workspace'] = self.CONTENT.workspace_of(proj)
+        return record
+
+    def iter_view_records(self):  # yield the projects of the current view in display order
+        if self.mode == 'open':
+            yield self.project_record('', self.mode_content)
+        elif self.mode_content == '*' or self.mode_content not in self.CONTENT.get_categories():
+            for proj in self.CONTENT.Projects:
+                if self.matches_filter(proj):
+                    yield self.project_record('', proj)
+        else:
+            for con in self.CONTENT.get_contexts(self.mode_content):
+                for proj in self.CONTENT.Projects:
+                    if self.matches_filter(proj) and self.CONTENT.check_context(proj,self.mode_content,con):
+                        yield self.project_record(con, proj)
+            for proj in self.CONTENT.Projects:
+                if self.matches_filter(proj) and self.CONTENT.check_no_context(proj, self.mode_content):
+                    yield self.project_record('(Ungrouped)', proj)
+
+    def prepare_bulk(self, args):  # select the projects of a bulk command, args without 'bulk'
+        action, params, filters = parse_bulk(args)
+        if filters is None:
+            filters = [list(f) for f in self.filter]
+        selection = filters + [params[:2]] if action in ['unlink', 'move'] else filters  # only projects that have the link
+        projects = self.CONTENT.select_projects(selection)
+        self.bulk_pending = (bulk_command(action, params, filters), projects)  # filters written out, e.g. for the daemon
+
+    def check(self, fix=False):
+        workspaces = self.workspaces()
+        if self.checker is None:
+            self.checker = {tag: IntegrityChecker(data) for tag, data in workspaces.items()}  # one per workspace
+        issues = []
+        rows = []
+        for tag, data in workspaces.items():
+            ws_issues = self.checker[tag].check()
+            if fix:
+                with data.transaction('check-fix'):  # the federation joins the workspaces into one undo step
+                    self.checker[tag].fix(ws_issues)
+                ws_issues = self.checker[tag].check()
+            issues += ws_issues
+            rows += [f" - {f'[{tag}] ' if tag else ''}{problem}{'' if issue_fix is None else ' (check-fix)'}" for problem, issue_fix in ws_issues]
+        self.report = (f"check: {len(issues)} problems", rows or [' - No problems found'])
+        return issues
+
+    def scan_disk(self):  # start the background disk scan of all workspaces, orphans are found with the current data
+        if self.disk is None:
+            self.disk = dict()
+        for tag, data in self.live_workspaces().items():
+            if tag not in self.disk:
+                self.disk[tag] = DiskScanner(data.LOCATION, self.disk_updated)
+            active, archive = (data.Projects, data.Archive_Projects) if not data.Archive_Bool else (data.Archive_Projects, data.Projects)
+            projects = {str(proj): {str(res) for res in ((content or dict()).get('resources') or dict())} for proj, content in active.items()}
+            self.disk[tag].start(projects, {str(proj) for proj in archive})
+
+    def disk_updated(self):  # called from the scanning thread
+        if self.on_disk_update is not None:
+            self.on_disk_update()
+
+    def disk_size(self, project, resource=None):  # bytes of a cloned resource or of all clones of a project, None if unknown
+        if self.disk is None:
+            return None
+        scanner = self.disk.get(self.CONTENT.workspace_of(project) if self.federated() else '')
+        if scanner is None or scanner.sizes is None or str(project) not in scanner.sizes:
+            return None
+        sizes = scanner.sizes[str(project)]
+        return sum(sizes.values()) if resource is None else sizes.get(str(resource))
+
+    def disk_report(self):  # (title, rows) with the disk usage of the clones, largest projects first
+        scanners = {tag: self.disk[tag] for tag in self.live_workspaces() if self.disk is not None and tag in self.disk}
+        if not scanners or any(scanner.sizes is None for scanner in scanners.values()):
+            return ('disk: scanning ...', [' The resource folders are scanned in the background, the report is shown when it is finished'])
+        entries = []  # (total, tag, project, resources)
+        for tag, scanner in scanners.items():
+            for proj, resources in scanner.sizes.items():
+                entries.append((sum(resources.values()), tag, proj, resources))
+        if self.disk_sort == 'name':
+            entries.sort(key=lambda entry: (entry[2], entry[1]))
+        else:
+            entries.sort(key=lambda entry: entry[0], reverse=True)
+        orphans = {(tag, proj, res): reason for tag, scanner in scanners.items() for proj, res, reason in scanner.orphans}
+
+        rows = []
+        for total, tag, proj, resources in entries:
+            rows.append(f" {format_size(total):>9}  {proj}{f' [{tag}]' if tag else ''}")
+            for res, size in sorted(resources.items(), key=lambda item: item[0] if self.disk_sort == 'name' else -item[1]):
+                reason = orphans.get((tag, proj, res))
+                rows.append(f" {format_size(size):>9}    - {res}{f' (orphan: {reason})' if reason else ''}")
+        if orphans:
+            rows += [' ', f" {len(orphans)} orphaned clones, 'disk-prune' to delete them"]
+        scanning = ' (scanning ...)' if any(scanner.scanning() for scanner in scanners.values()) else ''
+        return (f"disk: {format_size(sum(entry[0] for entry in entries))} in {sum(len(entry[3]) for entry in entries)} clones{scanning}", rows or [' No cloned resources'])
+
+    def prepare_prune(self):  # list the orphaned clones for disk-prune-apply
+        assert self.disk is not None and all(tag in self.disk for tag in self.live_workspaces()), "Run 'disk' first"
+        scanners = {tag: self.disk[tag] for tag in self.live_workspaces()}
+        assert not any(scanner.scanning() or scanner.sizes is None for scanner in scanners.values()), 'Disk scan is not finished yet'
+        self.prune_pending = [(tag, proj, res, reason) for tag, scanner in scanners.items() for proj, res, reason in scanner.orphans]
+        total = sum(scanners[tag].sizes[proj][res] for tag, proj, res, _ in self.prune_pending)
+        rows = [f" {format_size(scanners[tag].sizes[proj][res]):>9}  {proj}/{res}{f' [{tag}]' if tag else ''} ({reason})" for tag, proj, res, reason in self.prune_pending]
+        if self.prune_pending:
+            rows += [' ', " Type 'disk-prune-apply' to delete these folders (cannot be undone) or any other command to cancel."]
+        self.report = (f"disk-prune: {len(self.prune_pending)} orphaned clones, {format_size(total)}", rows or [' No orphaned clones'])
+
+    def overview_contexts(self, cat):  # contexts of a category in the order of the category overview
+        contexts = self.CONTENT.get_contexts(cat)
+        if self.cat_list_sort == 'count':
+            contexts.sort(key=lambda context: self.CONTENT.context_stats(cat, context)['projects'], reverse=True)
+        return contexts
+
+    def iter_category_records(self):  # yield the contexts of the category overview (f2)
+        for cat in self.CONTENT.get_categories():
+            for context in self.overview_contexts(cat):
+                qnote = ''
+                if self.CONTENT.check_context_in_data(cat, context):
+                    qnote = (self.CONTENT.Contexts[cat][context] or dict()).get('qnote', '')
+                stats = self.CONTENT.context_stats(cat, context)
+                yield {'category': cat, 'context': context, 'manual': self.CONTENT.check_context_in_data(cat, context),
+                       'projects': stats['projects'], 'archived': stats['archived'], 'cloned': stats['cloned'],
+                       'note': stats['note'], 'qnote': qnote}
+
+    def export(self, fmt, path, scope='view'):
+        assert fmt in EXPORT_FORMATS
+        assert scope in EXPORT_SCOPES
+        if scope == 'view':
+            records = self.iter_view_records()
+            fields = ['group', 'project', 'qnote', 'links', 'resources']
+        elif scope == 'categories':
+            records = self.iter_category_records()
+            fields = ['category', 'context', 'manual', 'projects', 'archived', 'cloned', 'note', 'qnote']
+        else:
+            records = self.CONTENT.iter_records()
+            fields = ['kind', 'name', 'category', 'qnote', 'links', 'resources']
+        if self.federated() and scope != 'categories':
+            fields.append('workspace')
+
+        if path == '-':
+            write_records(records, fields, fmt, sys.stdout)
+        else:
+            with open(os.path.expanduser(path), 'w', newline='') as outfile:
+                write_records(records, fields, fmt, outfile)
+
     def return_main_text(self):
+        from prompt_toolkit.formatted_text import HTML
+        self.CONTENT.refresh_files()  # [N] and [C] markers of notes and clones changed outside
         if self.help_message_visible:
             text_rows = HELP_MESSAGE.splitlines()
             return '\n'.join(text_rows[self.help_message_line:])
         
+        elif self.report is not None:
+            title, rows = self.report
+            text_rows = [f"### {html.escape(title)} ###"] + [html.escape(row) for row in rows]
+            return HTML('\n'.join(text_rows[self.line_start:]))
+
+        elif self.bulk_pending is not None:
+            args, projects = self.bulk_pending
+            text_rows = [f"### bulk {' '.join(args)} ###",
+                         f"{len(projects)} projects will be changed. Type 'bulk-apply' to apply or 'bulk-cancel' to cancel.",
+                         ' ']
+            for proj in projects:
+                text_rows.append(f" - {self.project_str(proj)}")
+            return HTML('\n'.join(text_rows[self.line_start:]))
+
         elif self.cat_list_visible:
             text_rows = []
             for cat in self.CONTENT.get_categories():
-                text_rows.append(f"# {cat}")
-                for context in self.CONTENT.get_contexts(cat):
-                    text_rows.append(f" - {self.context_str(cat, context)}")
+                text_rows.append(f"# {cat} <ansibrightblack>[{self.CONTENT.ungrouped_count(cat)} ungrouped]</ansibrightblack>")
+                for context in self.overview_contexts(cat):
+                    text_rows.append(f" - {self.context_str(cat, context, show_stats=True)}")
                 text_rows.append(' ')
             return HTML('\n'.join(text_rows[self.cat_list_line:]))
         
         elif self.mode == 'open':  # Open Mode
             open_proj = self.CONTENT.Projects[self.mode_content]  # dict of the project that is open
             text_rows = []
-            text_rows.append(f"### {self.project_str(self.mode_content)} ###")
+            size = self.disk_size(self.mode_content)
+            text_rows.append(f"### {self.project_str(self.mode_content)}{'' if size is None else f' <ansibrightblack>[{format_size(size)}]</ansibrightblack>'} ###")
             if 'resources' not in open_proj or not bool(open_proj['resources']):
                 text_rows.append('(No Resources)')
             else:
@@ -453,7 +1592,7 @@ class TUIManager:
             if self.mode_content == '*':
                 text_rows = []
                 for proj in self.CONTENT.Projects:
-                    if all([self.CONTENT.check_context(proj,f1,f2) for f1,f2 in self.filter]):
+                    if self.matches_filter(proj):
                         text_rows.append('- ' + self.project_str(proj))
                         if self.show_resources:
                             for res in self.CONTENT.get_resources(proj):
@@ -466,7 +1605,7 @@ class TUIManager:
                 for con in contexts:
                     text_rows.append(f"# {self.context_str(self.mode_content,con)}")
                     for proj in self.CONTENT.Projects:
-                        if all([self.CONTENT.check_context(proj,f1,f2) for f1,f2 in self.filter]):
+                        if self.matches_filter(proj):
                             if self.CONTENT.check_context(proj,self.mode_content,con):
                                 text_rows.append(f" - {self.project_str(proj)}")
                                 if self.show_resources:
@@ -475,7 +1614,7 @@ class TUIManager:
                     text_rows.append(f" ")
                 text_rows.append(f"# (Ungrouped)")
                 for proj in self.CONTENT.Projects:
-                    if all([self.CONTENT.check_context(proj,f1,f2) for f1,f2 in self.filter]):
+                    if self.matches_filter(proj):
                         if self.CONTENT.check_no_context(proj, self.mode_content):
                             text_rows.append(f" - {self.project_str(proj)}")
                             if self.show_resources:
@@ -488,27 +1627,38 @@ class TUIManager:
             return '(Data cannot be presented)'
     
     def return_head_text(self):
-        return HTML(f"<b>=== ProjectManager2 ===</b>  <ansigreen>Mode: '{self.mode} {self.mode_content}'</ansigreen> | Showing Resources: {self.show_resources} | Filters: {self.filter} | {'All safed' if not self.unsafed_changes else '<ansired>&gt; Unsafed Changes &lt;</ansired>'}{' | HELP-VIEW' if self.help_message_visible else ''}{' | CONTEXT-OVERVIEW' if self.cat_list_visible else ''} ===")
+        from prompt_toolkit.formatted_text import HTML
+        view_at = ''
+        if self.view_at is not None:
+            view_at = f" | <ansired>VIEW-AT {datetime.fromtimestamp(self.view_at / 1000).isoformat(sep=' ', timespec='seconds')} (read-only)</ansired>"
+        workspace = ''
+        if self.federated():
+            workspace = f" | Workspaces: {', '.join(self.CONTENT.workspaces)} (new in <ansimagenta>{self.CONTENT.target}</ansimagenta>)"
+        return HTML(f"<b>=== ProjectManager2 ===</b>  <ansigreen>Mode: '{self.mode} {self.mode_content}'</ansigreen> | Showing Resources: {self.show_resources} | Filters: {self.filter} | {'All safed' if not self.unsafed_changes else '<ansired>&gt; Unsafed Changes &lt;</ansired>'}{' | HELP-VIEW' if self.help_message_visible else ''}{' | CONTEXT-OVERVIEW' if self.cat_list_visible else ''}{' | BULK-PREVIEW' if self.bulk_pending is not None else ''}{' | REPORT' if self.report is not None else ''}{view_at}{' | DAEMON' if self.attached else ''}{workspace} ===")
     
     def autocomplete_dict_suggestions(self):
-        projects_dict = {proj: None for proj in sorted(self.CONTENT.Projects.keys())}
-        categories_dict = {cat: None for cat in sorted(self.CONTENT.get_categories())}
-        categories_contexts_dict = {cat: {con: None for con in sorted(self.CONTENT.get_contexts(cat))} for cat in sorted(self.CONTENT.get_categories())}
-        projects_resources_dict = {proj: {res: None for res in sorted(self.CONTENT.get_resources(proj))} for proj in sorted(self.CONTENT.Projects.keys())}
+        projects = self.ranked('project', self.CONTENT.Projects.keys())
+        categories = self.ranked('category', self.CONTENT.get_categories())
+        contexts = {cat: self.ranked('context', self.CONTENT.get_contexts(cat), cat) for cat in categories}
+        projects_dict = {proj: None for proj in projects}
+        categories_dict = {cat: None for cat in categories}
+        categories_contexts_dict = {cat: {con: None for con in contexts[cat]} for cat in categories}
+        projects_resources_dict = {proj: {res: None for res in self.ranked('resource', self.CONTENT.get_resources(proj), proj)} for proj in projects}
         def resources(proj):
-            return {res: None for res in sorted(self.CONTENT.get_resources(proj))}
+            return {res: None for res in self.ranked('resource', self.CONTENT.get_resources(proj), proj)}
         def resources_actions(proj):
-            return {res: {'code': None,'clone': None,'checkout': None,'open': None} for res in sorted(self.CONTENT.get_resources(proj))}
-        projects_resources_actions_dict = {proj: resources_actions(proj) for proj in sorted(self.CONTENT.Projects.keys())}
-        projects_categories_contexts_dict = {proj: categories_contexts_dict for proj in sorted(self.CONTENT.Projects.keys())}
-        categories_contexts_contexts_dict = {cat: {con: {con2: None for con2 in sorted(self.CONTENT.get_contexts(cat))} for con in sorted(self.CONTENT.get_contexts(cat))} for cat in sorted(self.CONTENT.get_categories())}
-        projects_categories_contexts_contexts_dict = {proj: categories_contexts_contexts_dict for proj in sorted(self.CONTENT.Projects.keys())}
+            return {res: {'code': None,'clone': None,'checkout': None,'open': None} for res in self.ranked('resource', self.CONTENT.get_resources(proj), proj)}
+        projects_resources_actions_dict = {proj: resources_actions(proj) for proj in projects}
+        projects_categories_contexts_dict = {proj: categories_contexts_dict for proj in projects}
+        categories_contexts_contexts_dict = {cat: {con: {con2: None for con2 in contexts[cat]} for con in contexts[cat]} for cat in categories}
+        projects_categories_contexts_contexts_dict = {proj: categories_contexts_contexts_dict for proj in projects}
 
         complete_dict = {
             'open': projects_dict,
             'group': categories_dict,
             'filter': categories_contexts_dict,
             'filter-remove': None,
+            'overview-sort': {'name': None, 'count': None},
             'note': projects_dict,
             'context-note': categories_contexts_dict,
             'backup': None,
@@ -517,6 +1667,8 @@ class TUIManager:
             'show-resources': None,
             'show-cat': categories_dict,
             'dump': None,
+            'undo': None,
+            'redo': None,
             'create': None,
             'delete': projects_dict,
             'link': projects_categories_contexts_dict,
@@ -531,8 +1683,21 @@ class TUIManager:
             'context-qnote': categories_contexts_dict,
             'context-qnote-delete': categories_contexts_dict,
             'archive' : projects_dict,
-            'archive-context': categories_contexts_dict
+            'archive-context': categories_contexts_dict,
+            'export': {fmt: None for fmt in EXPORT_FORMATS},
+            'bulk': {'link': categories_contexts_dict, 'unlink': categories_contexts_dict, 'move': categories_contexts_contexts_dict, 'archive': None, 'qnote': None},
+            'bulk-apply': None,
+            'bulk-cancel': None,
+            'check': None,
+            'check-fix': None,
+            'history': None,
+            'view-at': {'now': None},
+            'disk': {'size': None, 'name': None},
+            'disk-prune': None,
+            'disk-prune-apply': None
         }
+        if self.federated():
+            complete_dict['workspace'] = {tag: None for tag in self.CONTENT.workspaces}
         if self.mode == 'open':
             open_proj = self.mode_content
             complete_dict['resource'] = resources_actions(open_proj)
@@ -546,6 +1711,31 @@ class TUIManager:
         complete_dict = dict(sorted(complete_dict.items()))
         return complete_dict
 
+    def ranked(self, kind, names, *parents):  # most used first (frecency), otherwise alphabetically
+        names = sorted(names)
+        if self.frecency is None:
+            return names
+        now = time.time()
+        return sorted(names, key=lambda name: -self.frecency.score(now, kind, *parents, name))
+
+    def record_usage(self, args):  # update the frecency of the projects, categories, ... used in a command
+        if self.frecency is None or args[0] not in USAGE_ARGS:
+            return
+        if args[0] in ['resource', 'resource-create', 'resource-delete'] and self.mode == 'open':
+            args = [args[0], self.mode_content] + args[1:]
+        project = category = None
+        for kind, name in zip(USAGE_ARGS[args[0]], args[1:]):
+            if kind == 'project':
+                project = name
+                self.frecency.use(kind, name)
+            elif kind == 'category':
+                category = name
+                self.frecency.use(kind, name)
+            elif kind == 'context':
+                self.frecency.use(kind, category, name)
+            elif kind == 'resource':
+                self.frecency.use(kind, project, name)
+
     def toggle_show_cat(self, category):
         assert category in self.CONTENT.get_categories()
         if category in self.show_cats:
@@ -553,7 +1743,34 @@ class TUIManager:
         else:
             self.show_cats.append(category)
 
+def check_read_only(tuimanager: TUIManager, args):  # snapshot views cannot be modified
+    if tuimanager.view_at is not None and args[0] in DAEMON_COMMANDS + ['disk-prune', 'disk-prune-apply']:
+        raise ValueError(f"Command {args[0]} is not possible in a snapshot view, use 'view-at now' first")
+
 def CommandParser(data: Data, tuimanager: TUIManager, args):
+    if args[0] not in ['bulk', 'bulk-apply']:  # preview is only valid until the next command
+        tuimanager.bulk_pending = None
+    if args[0] != 'disk-prune-apply':
+        tuimanager.prune_pending = None
+    tuimanager.report = None
+    check_read_only(tuimanager, args)
+
+    if args[0] in ['undo', 'redo']:
+        steps = int(args[1]) if len(args) > 1 else 1
+        for _ in range(steps):
+            if args[0] == 'undo':
+                data.undo()
+            else:
+                data.redo()
+        if tuimanager.mode == 'open' and tuimanager.mode_content not in tuimanager.CONTENT.Projects:  # Opened project was removed
+            tuimanager.mode = 'group'
+            tuimanager.mode_content = '*'
+    else:
+        with data.transaction(' '.join(args)):  # one undo step per command
+            run_command(data, tuimanager, args)
+    tuimanager.unsafed_changes = data.undo_log.dirty()
+
+def run_command(data: Data, tuimanager: TUIManager, args):
     if args[0] == 'code':
         os.system(f"code '{data.LOCATION}'")
     elif args[0] == 'reload':
@@ -568,7 +1785,7 @@ def CommandParser(data: Data, tuimanager: TUIManager, args):
         data.remove_project(args[1])
         tuimanager.unsafed_changes = True
     elif args[0] == 'open':
-        assert args[1] in data.Projects
+        assert args[1] in tuimanager.CONTENT.Projects
         tuimanager.mode = 'open'
         tuimanager.mode_content = args[1]
         tuimanager.line_start = 0
@@ -578,7 +1795,7 @@ def CommandParser(data: Data, tuimanager: TUIManager, args):
             tuimanager.mode_content = '*'
             tuimanager.line_start = 0
         else:
-            assert args[1] == '*' or args[1] in data.get_categories() 
+            assert args[1] == '*' or args[1] in tuimanager.CONTENT.get_categories() 
             tuimanager.mode = 'group'
             tuimanager.mode_content = args[1]
             tuimanager.line_start = 0
@@ -655,6 +1872,9 @@ def CommandParser(data: Data, tuimanager: TUIManager, args):
             tuimanager.filter.remove([args[1],args[2]])
         else:
             tuimanager.filter.append([args[1],args[2]])
+    elif args[0] == 'overview-sort':
+        assert args[1] in ['name', 'count']
+        tuimanager.cat_list_sort = args[1]
     elif args[0] == 'filter-remove':
         tuimanager.filter = []
     elif args[0] == 'qnote-delete':
@@ -672,76 +1892,323 @@ def CommandParser(data: Data, tuimanager: TUIManager, args):
     elif args[0] == 'archive-context':
         data.archive_context(args[1], args[2])
         tuimanager.unsafed_changes = True
+    elif args[0] == 'bulk':
+        tuimanager.prepare_bulk(args[1:])
+        tuimanager.line_start = 0
+    elif args[0] == 'bulk-apply':
+        assert tuimanager.bulk_pending is not None
+        bulk_args, projects = tuimanager.bulk_pending
+        if bulk_args[0] == 'archive' and tuimanager.mode == 'open' and tuimanager.mode_content in projects:  # Jump out of open mode
+            tuimanager.mode = 'group'
+            tuimanager.mode_content = '*'
+        action, params, _ = parse_bulk(bulk_args)
+        data.bulk(action, params, projects)
+        tuimanager.bulk_pending = None
+        tuimanager.unsafed_changes = True
+    elif args[0] == 'bulk-cancel':
+        tuimanager.bulk_pending = None
+    elif args[0] == 'check':
+        tuimanager.check()
+        tuimanager.line_start = 0
+    elif args[0] == 'check-fix':
+        tuimanager.check(fix=True)
+        tuimanager.line_start = 0
+    elif args[0] == 'history':
+        tuimanager.report = ('history (view-at <NUMBER>)', data.history.summary() or [' No snapshots yet, they are written with every dump'])
+        tuimanager.line_start = 0
+    elif args[0] == 'view-at':
+        if args[1] == 'now':
+            tuimanager.CONTENT = data
+            tuimanager.view_at = None
+        else:
+            stamp = data.history.find(args[1])
+            tuimanager.CONTENT = Data(data.LOCATION, data.Archive_Bool, snapshot=data.history.state_at(stamp))
+            tuimanager.view_at = stamp
+        tuimanager.checker = None
+        if tuimanager.mode == 'open' and tuimanager.mode_content not in tuimanager.CONTENT.Projects:
+            tuimanager.mode = 'group'
+            tuimanager.mode_content = '*'
+        elif tuimanager.mode == 'group' and tuimanager.mode_content not in ['*'] + tuimanager.CONTENT.get_categories():
+            tuimanager.mode_content = '*'
+        tuimanager.line_start = 0
+    elif args[0] == 'disk':
+        if len(args) > 1:
+            assert args[1] in ['size', 'name']
+            tuimanager.disk_sort = args[1]
+        tuimanager.scan_disk()
+        tuimanager.report = tuimanager.disk_report()
+        tuimanager.line_start = 0
+    elif args[0] == 'disk-prune':
+        tuimanager.prepare_prune()
+        tuimanager.line_start = 0
+    elif args[0] == 'disk-prune-apply':
+        assert tuimanager.prune_pending is not None
+        workspaces = tuimanager.live_workspaces()
+        for tag, proj, res, _ in tuimanager.prune_pending:
+            workspaces[tag].delete_clone(proj, res)
+        tuimanager.prune_pending = None
+        tuimanager.scan_disk()
+        tuimanager.report = tuimanager.disk_report()
+        tuimanager.line_start = 0
+    elif args[0] == 'export':
+        assert args[2] != '-', "Printing to stdout is only possible without the TUI (pm.py LOCATION -e FORMAT -)"
+        if len(args) > 3:
+            scope = args[3]
+        else:
+            scope = 'categories' if tuimanager.cat_list_visible else 'view'
+        tuimanager.export(args[1], args[2], scope)
     else:
         raise ValueError(f"Unknown Arguments {args}")
 
 
-class MyNestedCompleter(NestedCompleter):  # Adding the WORD option to the nested completer
-    def get_completions(
-        self, document: Document, complete_event: CompleteEvent
-    ) -> Iterable[Completion]:
-        # Split document.
-        text = document.text_before_cursor.lstrip()
-        stripped_len = len(document.text_before_cursor) - len(text)
-
-        # If there is a space, check for the first term, and use a
-        # subcompleter.
-        if " " in text:
-            first_term = text.split()[0]
-            completer = self.options.get(first_term)
-
-            # If we have a sub completer, use this for the completions.
-            if completer is not None:
-                remaining_text = text[len(first_term) :].lstrip()
-                move_cursor = len(text) - len(remaining_text) + stripped_len
-
-                new_document = Document(
-                    remaining_text,
-                    cursor_position=document.cursor_position - move_cursor,
-                )
-
-                yield from completer.get_completions(new_document, complete_event)
-
-        # No space in the input: behave exactly like `WordCompleter`.
+def socket_path(LOCATION):
+    return os.path.join(LOCATION, SOCKET_NAME)
+
+def send_request(LOCATION, request):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path(LOCATION))
+        sock.sendall((json.dumps(request) + '\n').encode())
+        with sock.makefile('r') as reply:
+            return json.loads(reply.readline())
+
+def daemon_running(LOCATION):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path(LOCATION))
+        return True
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:  # only checked whether the daemon is running
+            return
+        request = json.loads(line)
+        response = self.server.serve(request)
+        self.wfile.write((json.dumps(response, default=str) + '\n').encode())
+
+
+class Daemon(socketserver.UnixStreamServer):
+    """Keeps the data in memory and executes commands sent over the unix socket one after another."""
+    def __init__(self, data: Data):
+        self.data = data
+        self.version = 0  # counts the requests with commands, clients only get the state again when it changed
+        super().__init__(socket_path(data.LOCATION), DaemonHandler)
+
+    def serve(self, request):
+        from prompt_toolkit.formatted_text import to_plain_text
+        if request.get('archive', False) != self.data.Archive_Bool:
+            return {'ok': False, 'error': f"Daemon serves {'the archive' if self.data.Archive_Bool else 'the active projects'}", 'unsafed_changes': self.data.undo_log.dirty()}
+        man = TUIManager(self.data)  # every request starts with a fresh view
+        try:
+            for args in request.get('commands', []):
+                CommandParser(self.data, man, args)
+            response = {'ok': True, 'text': to_plain_text(man.return_main_text()) if request.get('text', True) else ''}
+        except Exception as e:
+            response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        if request.get('commands'):
+            self.version += 1
+        response['unsafed_changes'] = self.data.undo_log.dirty()
+        response['version'] = self.version
+        if request.get('state', False) and request.get('version') != self.version:
+            import yaml  # as text, so that keys like years stay numbers (json would turn them into strings)
+            response['state'] = yaml.dump(self.data.get_state(), Dumper=getattr(yaml, 'CSafeDumper', yaml.SafeDumper), sort_keys=False)
+        return response
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(socket_path(self.data.LOCATION)):
+            os.remove(socket_path(self.data.LOCATION))
+
+
+def RemoteCommandParser(data: Data, tuimanager: TUIManager, args):
+    """Like CommandParser, but modifications are executed by the daemon and data is a mirror of its state."""
+    check_read_only(tuimanager, args)  # before anything is sent to the daemon
+    if args[0] in ['resource-create', 'resource-delete'] and tuimanager.mode == 'open':
+        args = [args[0], tuimanager.mode_content] + args[1:]
+    commands = [args] if args[0] in DAEMON_COMMANDS else []
+    if args[0] == 'bulk-apply':  # the daemon selects the same projects again
+        assert tuimanager.bulk_pending is not None
+        commands = [['bulk'] + tuimanager.bulk_pending[0], args]
+    response = send_request(data.LOCATION, {'commands': commands, 'state': True, 'version': tuimanager.daemon_version, 'text': False, 'archive': data.Archive_Bool})
+    if 'state' in response:  # only sent when the data of the daemon changed
+        import yaml
+        data.set_state(yaml.load(response['state'], Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)))
+    tuimanager.daemon_version = response.get('version')
+    if not response['ok']:
+        raise ValueError(response['error'])
+    if args[0] not in DAEMON_COMMANDS:
+        CommandParser(data, tuimanager, args)
+    elif args[0] == 'check-fix':  # show what is left
+        CommandParser(data, tuimanager, ['check'])
+    else:
+        tuimanager.bulk_pending = None
+        tuimanager.report = None
+        if tuimanager.mode == 'open' and tuimanager.mode_content not in data.Projects:  # Opened project was removed
+            tuimanager.mode = 'group'
+            tuimanager.mode_content = '*'
+    tuimanager.unsafed_changes = response['unsafed_changes']
+
+
+def FederatedCommandParser(federation: Federation, tuimanager: TUIManager, args):
+    """Like CommandParser, but each command is executed by the workspace it concerns.
+    dump, reload and backup are done for every workspace, undo and redo follow the order of the modifications."""
+    if args[0] == 'workspace':
+        assert args[1] in federation.workspaces
+        federation.target = args[1]
+        tuimanager.bulk_pending = None
+        tuimanager.report = None
+        return
+    if args[0] == 'create':
+        assert args[1] not in federation.Projects, f"Project {args[1]} exists already"
+
+    counters = {tag: data.undo_log.counter for tag, data in federation.workspaces.items()}
+    try:
+        if args[0] in ['undo', 'redo']:
+            steps = int(args[1]) if len(args) > 1 else 1
+            done, pending = (federation.undo_order, federation.redo_order) if args[0] == 'undo' else (federation.redo_order, federation.undo_order)
+            for _ in range(steps):
+                step = federation.last_step(done, f"{args[0]}_stack")
+                assert step, f"Nothing to {args[0]}"
+                for tag, _ in (reversed(step) if args[0] == 'undo' else step):  # all workspaces of the command
+                    CommandParser(federation.workspaces[tag], tuimanager, [args[0]])
+                done.pop()
+                pending.append(step)
+        elif args[0] in ['dump', 'reload', 'backup']:
+            for data in federation.workspaces.values():
+                CommandParser(data, tuimanager, args)
+            if args[0] == 'reload':  # new undo logs
+                federation.undo_order.clear()
+                federation.redo_order.clear()
+                counters = {tag: data.undo_log.counter for tag, data in federation.workspaces.items()}
+                duplicates = federation.duplicates()
+                assert not duplicates, f"Projects in several workspaces, only the first is shown: {', '.join(duplicates)}"
+        elif args[0] == 'bulk-apply':  # one undo step over all workspaces
+            assert tuimanager.bulk_pending is not None
+            bulk_args, projects = tuimanager.bulk_pending
+            applied = []
+            try:
+                for tag, data in federation.workspaces.items():
+                    owned = [proj for proj in projects if federation.owner(proj) == tag]
+                    if owned:
+                        tuimanager.bulk_pending = (bulk_args, owned)
+                        CommandParser(data, tuimanager, args)
+                        applied.append(tag)
+            except Exception:  # nothing is kept, as in a single workspace
+                for tag in reversed(applied):
+                    data = federation.workspaces[tag]
+                    data.undo()
+                    data.undo_log.drop_redo()
+                    counters[tag] = data.undo_log.counter
+                tuimanager.bulk_pending = (bulk_args, projects)
+                raise
+            tuimanager.bulk_pending = None
         else:
-            completer = WordCompleter(
-                list(self.options.keys()), ignore_case=self.ignore_case,WORD=True
-            )
-            yield from completer.get_completions(document, complete_event)
-
-
-def main():
-    # Load Location
-    parser = argparse.ArgumentParser()
-    parser.add_argument('LOCATION', type=Path, help='Specify folder.')
-    parser.add_argument('-i', '--init', action='store_true', help='Initialize necessary files in the folder.')
-    parser.add_argument('-a', '--archive', action='store_true', help='Open the archive instead of active.')
-    
-    args = parser.parse_args()
-    LOCATION = args.LOCATION.resolve()
-
-    assert os.path.exists(LOCATION)  # Make sure location exists
+            CommandParser(federation.route(args, tuimanager.mode, tuimanager.mode_content), tuimanager, args)
+            if args[0] == 'view-at' and args[1] == 'now':
+                tuimanager.CONTENT = federation
+    finally:
+        changed = [(tag, data.undo_log.counter) for tag, data in federation.workspaces.items() if data.undo_log.counter != counters[tag]]
+        if changed:  # one undo step, even if several workspaces were modified (bulk-apply, check-fix)
+            federation.undo_order.append(changed)
+            federation.redo_order.clear()
+        tuimanager.unsafed_changes = any(data.undo_log.dirty() for data in federation.workspaces.values())
+
+
+def run_query(data: Data, man: TUIManager, args):
+    """Print the result of a query as plain text or JSON"""
+    keys = ['project', 'qnote', 'links', 'resources'] + (['workspace'] if man.federated() else [])
+    if args.query == 'projects':
+        for cat, context in args.filter:
+            (FederatedCommandParser if man.federated() else CommandParser)(data, man, ['filter', cat, context])
+        records = ({key: rec[key] for key in keys} for rec in man.iter_view_records())
+        if args.json:
+            print(json.dumps(list(records), default=str, indent=2))
+        else:
+            for rec in records:
+                print(rec['project'] + (f" [{rec['workspace']}]" if 'workspace' in rec else '') + (f"  ({rec['qnote']})" if rec['qnote'] else ''))
 
-    if args.init:
-        print('Initializing files ...')
-        files_to_create = ["Active_Contexts.yaml", "Active_Projects.yaml","Archive_Contexts.yaml", "Archive_Projects.yaml"]
-        for file in files_to_create:
-            filepath = os.path.join(LOCATION,file)
-            if not os.path.isfile(filepath):
-                with open(filepath, "w+") as f:
-                    pass
-                print(f"Created file: {file}")
+    elif args.query == 'categories':
+        if args.json:
+            print(json.dumps(data.get_categories(), default=str, indent=2))
+        else:
+            print('\n'.join(str(cat) for cat in data.get_categories()))
+
+    elif args.query == 'contexts':
+        if args.CATEGORY is not None and args.CATEGORY not in data.get_categories():
+            sys.exit(f"Unknown category {args.CATEGORY}")
+        categories = [args.CATEGORY] if args.CATEGORY is not None else data.get_categories()
+        if args.json:
+            print(json.dumps({cat: data.get_contexts(cat) for cat in categories}, default=str, indent=2))
+        elif args.CATEGORY is not None:
+            print('\n'.join(str(context) for context in data.get_contexts(args.CATEGORY)))
+        else:
+            for cat in categories:
+                print(f"# {cat}")
+                for context in data.get_contexts(cat):
+                    print(f" - {context}")
+
+    elif args.query == 'show':
+        if args.PROJECT not in data.Projects:
+            sys.exit(f"Unknown project {args.PROJECT}")
+        rec = man.project_record('', args.PROJECT)
+        if args.json:
+            print(json.dumps({key: rec[key] for key in keys}, default=str, indent=2))
+        else:
+            print(rec['project'] + (f" [{rec['workspace']}]" if 'workspace' in rec else '') + (f"  ({rec['qnote']})" if rec['qnote'] else ''))
+            print('Links:' if rec['links'] else 'Links: None')
+            for cat, contexts in rec['links'].items():
+                print(f"  {cat}: {', '.join(str(context) for context in contexts or [])}")
+            print('Resources:' if rec['resources'] else 'Resources: None')
+            for res, res_dict in rec['resources'].items():
+                print(f"  {res}: {res_dict['type']} {res_dict['source']}")
+
+
+def run_tui(data: Data, man: TUIManager):
+    """Full screen application. prompt_toolkit is imported only here to keep queries fast."""
+    from prompt_toolkit import Application
+    from prompt_toolkit.completion import CompleteEvent,WordCompleter, NestedCompleter,Completion
+    from prompt_toolkit.document import Document
+    from prompt_toolkit.layout import Layout
+    from prompt_toolkit.layout.containers import HSplit, Window
+    from prompt_toolkit.layout.controls import FormattedTextControl
+    from prompt_toolkit.key_binding import KeyBindings
+    from prompt_toolkit.widgets import TextArea
+
+    class MyNestedCompleter(NestedCompleter):  # Adding the WORD option to the nested completer
+        def get_completions(
+            self, document: Document, complete_event: CompleteEvent
+        ) -> Iterable[Completion]:
+            # Split document.
+            text = document.text_before_cursor.lstrip()
+            stripped_len = len(document.text_before_cursor) - len(text)
+
+            # If there is a space, check for the first term, and use a
+            # subcompleter.
+            if " " in text:
+                first_term = text.split()[0]
+                completer = self.options.get(first_term)
+
+                # If we have a sub completer, use this for the completions.
+                if completer is not None:
+                    remaining_text = text[len(first_term) :].lstrip()
+                    move_cursor = len(text) - len(remaining_text) + stripped_len
+
+                    new_document = Document(
+                        remaining_text,
+                        cursor_position=document.cursor_position - move_cursor,
+                    )
+
+                    yield from completer.get_completions(new_document, complete_event)
+
+            # No space in the input: behave exactly like `WordCompleter`.
             else:
-                print(f"File {file} already exists.")
-
-
-    # Load Data
-    data = Data(LOCATION, args.archive)
-    data.load()
-
-    # Start the Manager
-    man = TUIManager(data)
-    
+                completer = WordCompleter(
+                    list(self.options.keys()), ignore_case=self.ignore_case,WORD=True
+                )
+                yield from completer.get_completions(document, complete_event)
 
     ####
     # Prompt toolkit
@@ -793,7 +2260,15 @@ def main():
     @kb.add('enter')
     def handle_enter(event):
         command = command_input.text  # get text
-        CommandParser(data, man, command.split())  # Parse the command
+        if man.attached:
+            RemoteCommandParser(data, man, command.split())  # Let the daemon do the modifications
+        elif isinstance(data, Federation):
+            FederatedCommandParser(data, man, command.split())  # Let the owning workspace do the modifications
+        else:
+            CommandParser(data, man, command.split())  # Parse the command
+        man.record_usage(command.split())
+        if command.split()[0] == 'dump':
+            man.frecency.save()
         output_text.text = man.return_main_text()
         head_text.text = man.return_head_text()
         command_input.text = ''  # Clear the input area
@@ -887,16 +2362,150 @@ def main():
         full_screen=True
     )
 
+    def refresh_disk():  # a background disk scan is finished
+        if man.report is not None and man.report[0].startswith('disk:'):
+            man.report = man.disk_report()
+        output_text.text = man.return_main_text()
+        application.invalidate()
+
+    def disk_updated():  # called from the scanning thread, the redraw is done by the event loop
+        if application.loop is not None:
+            application.loop.call_soon_threadsafe(refresh_disk)
+
+    man.on_disk_update = disk_updated
+
     # Load once
+    man.frecency = Frecency(data.LOCATION)
     head_text.text = man.return_head_text()
     output_text.text = man.return_main_text()
     # command_input.completer = WordCompleter(man.autocomplete_suggestions(), ignore_case=False,WORD=True)
     command_input.completer = MyNestedCompleter.from_nested_dict(man.autocomplete_dict_suggestions())
-    application.run()
+    application.run(pre_run=man.scan_disk)  # sizes for the open view, started when the loop can take the redraw
+    man.frecency.save()
 
     # breakpoint()
 
 
+def main():
+    # Load Location
+    parser = argparse.ArgumentParser()
+    parser.add_argument('LOCATION', type=Path, help='Specify folder.')
+    parser.add_argument('-i', '--init', action='store_true', help='Initialize necessary files in the folder.')
+    parser.add_argument('-a', '--archive', action='store_true', help='Open the archive instead of active.')
+    parser.add_argument('-e', '--export', nargs=2, metavar=('FORMAT', 'PATH'), help=f"Export without starting the TUI. FORMAT: {', '.join(EXPORT_FORMATS)}; PATH '-' for stdout.")
+    parser.add_argument('--scope', choices=EXPORT_SCOPES, default='view', help='What to export (default: view).')
+    parser.add_argument('-g', '--group', default='*', metavar='CATEGORY', help='Group view used for the export.')
+    parser.add_argument('-f', '--filter', nargs=2, action='append', default=[], metavar=('CATEGORY', 'CONTEXT'), help='Filter used for the export (can be repeated).')
+    parser.add_argument('-c', '--check', action='store_true', help='Check links, notes and resource folders, print the problems and exit.')
+    parser.add_argument('-d', '--daemon', action='store_true', help='Keep the data loaded and serve commands on a unix socket in the folder.')
+    parser.add_argument('-w', '--with', dest='workspaces', type=Path, action='append', default=[], metavar='LOCATION', help='Show another workspace together with LOCATION (can be repeated).')
+    parser.add_argument('-s', '--send', metavar='COMMAND', help="Send commands (separated by ';') to the running daemon and print the resulting view.")
+
+    # Queries (print and exit)
+    queries = parser.add_subparsers(dest='query', title='queries', description='Print information without starting the TUI.')
+    query_options = argparse.ArgumentParser(add_help=False)
+    query_options.add_argument('--json', action='store_true', help='Print JSON instead of plain text.')
+    projects_parser = queries.add_parser('projects', parents=[query_options], help='List projects.')
+    projects_parser.add_argument('-f', '--filter', nargs=2, action='append', default=argparse.SUPPRESS, metavar=('CATEGORY', 'CONTEXT'), help='Only projects linked to that context (can be repeated).')
+    queries.add_parser('categories', parents=[query_options], help='List categories.')
+    contexts_parser = queries.add_parser('contexts', parents=[query_options], help='List contexts of a category (of all categories if left out).')
+    contexts_parser.add_argument('CATEGORY', nargs='?')
+    show_parser = queries.add_parser('show', parents=[query_options], help='Show quicknote, links and resources of a project.')
+    show_parser.add_argument('PROJECT')
+    
+    args = parser.parse_args()
+    LOCATION = args.LOCATION.resolve()
+
+    assert os.path.exists(LOCATION)  # Make sure location exists
+
+    if args.send:  # Thin client, the daemon has the data loaded already
+        if not daemon_running(LOCATION):
+            sys.exit(f"No daemon running for {LOCATION} (start it with: pm.py {LOCATION} --daemon)")
+        commands = [command.split() for command in args.send.split(';') if command.strip()]
+        response = send_request(LOCATION, {'commands': commands, 'archive': args.archive})
+        if not response['ok']:
+            sys.exit(response['error'])
+        print(response['text'])
+        return
+
+    if args.init:
+        print('Initializing files ...')
+        files_to_create = ["Active_Contexts.yaml", "Active_Projects.yaml","Archive_Contexts.yaml", "Archive_Projects.yaml"]
+        for file in files_to_create:
+            filepath = os.path.join(LOCATION,file)
+            if not os.path.isfile(filepath):
+                with open(filepath, "w+") as f:
+                    pass
+                print(f"Created file: {file}")
+            else:
+                print(f"File {file} already exists.")
+
+
+    # Load Data
+    locations = [LOCATION] + [location.resolve() for location in args.workspaces]
+    if len(locations) > 1:  # several workspaces, loaded in parallel
+        for location in locations:
+            assert os.path.exists(location)
+        if args.daemon:
+            sys.exit('A daemon serves a single workspace, start one per LOCATION')
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor() as pool:  # parsing yaml holds the GIL, threads would not help
+            workspaces = list(pool.map(Data, locations, [args.archive] * len(locations)))
+        try:
+            data = Federation(dict(zip(workspace_tags(locations), workspaces)))
+        except ValueError as e:  # a project name must be unique over the workspaces
+            sys.exit(str(e))
+    else:
+        data = Data(LOCATION, args.archive)  # loads the files
+
+    # Start the Manager
+    man = TUIManager(data)
+
+    if args.query:
+        run_query(data, man, args)
+        return
+
+    if args.check:
+        issues = man.check()
+        print('\n'.join(man.report[1]))
+        sys.exit(1 if issues else 0)
+
+    if args.export:  # Headless export
+        command_parser = FederatedCommandParser if man.federated() else CommandParser
+        command_parser(data, man, ['group', args.group])
+        for cat, context in args.filter:
+            command_parser(data, man, ['filter', cat, context])
+        man.export(args.export[0], args.export[1], args.scope)
+        return
+
+    if args.daemon:
+        if daemon_running(LOCATION):
+            sys.exit(f"A daemon is already running for {LOCATION}")
+        if os.path.exists(socket_path(LOCATION)):  # left over from a daemon that was killed
+            os.remove(socket_path(LOCATION))
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        import prompt_toolkit.formatted_text  # imported now instead of with the first request
+        with Daemon(data) as server:
+            print(f"Serving {LOCATION} (stop with ctrl-c, changes are only kept after 'dump')")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return
+
+    # Attach to a running daemon, so that only the daemon dumps the files
+    attached = not man.federated() and daemon_running(LOCATION)
+    if attached:
+        try:
+            RemoteCommandParser(data, man, ['group'])  # mirror the state of the daemon
+        except ValueError as e:
+            sys.exit(f"{e}, stop the daemon to open this view.")
+        man.attached = True
+    
+
+    run_tui(data, man)
+
+
 if __name__ == "__main__":
     main()
 